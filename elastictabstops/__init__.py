@@ -9,6 +9,12 @@ Repo at: https://github.com/nickgravgaard/elastic-tabstops-py
 # Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
 # This code is licensed under the MIT Licence - see LICENCE.txt
 
-from elastictabstops.classes import Text, Table
+__version__ = '1.0.1'
 
-__all__ = ['Text', 'Table']
+from elastictabstops.classes import Text, Table, LiveTable, TableFormatter
+from elastictabstops.convert import Limits, TokenCache
+from elastictabstops.stream import elastic_tabstops_to_spaces
+from elastictabstops.operations import OPERATIONS, convert_text, convert_many
+from elastictabstops.job import ConversionJob
+
+__all__ = ['Text', 'Table', 'LiveTable', 'TableFormatter', 'Limits', 'TokenCache', 'elastic_tabstops_to_spaces', 'OPERATIONS', 'convert_text', 'convert_many', 'ConversionJob']
@@ -0,0 +1,8 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+import sys
+
+from elastictabstops.cli import main
+
+sys.exit(main())
@@ -6,15 +6,12 @@
 #  * it doesn't follow the Maximum Line Length rule
 # use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
 
-# Abstract Base Classes ("abc") of the "collection" module were moved to "collections.abc" 
-# with Python:3.3, see https://docs.python.org/3.9/library/collections.html#module-collections
-import sys
-if sys.version_info.major >= 3 and sys.version_info.minor >= 3:
-	from collections.abc import Sequence
-else:
-	from collections import Sequence
+from collections.abc import Mapping, Sequence
+import csv
+import itertools
 
-from elastictabstops.convert import _from_spaces, _from_elastic_tabstops, _from_fixed_tabstops, _to_spaces, _to_elastic_tabstops, _to_fixed_tabstops
+from elastictabstops.convert import _from_spaces, _from_elastic_tabstops, _from_fixed_tabstops, _to_spaces, _to_elastic_tabstops, _to_fixed_tabstops, _min_cell_width, _to_spaces_multi, _to_fixed_tabstops_multi, _format_row, _is_ndarray, _format_array, _to_spaces_diff, _is_aligned_spaces, _is_canonical_elastic, _render_window
+from elastictabstops.stream import MappedElasticRows
 
 
 class Text(Sequence):
@@ -46,50 +43,351 @@ class Text(Sequence):
 
 	def __ne__(self, other): return not self.__eq__(other)
 
-	def from_spaces(self, tab_width=8):
-		return Table(_from_spaces(self.string, tab_width))
+	def from_spaces(self, tab_width=8, indent_only=False, limits=None, cache=None, engine=None):
+		return Table(_from_spaces(self.string, tab_width, indent_only=indent_only, limits=limits, cache=cache, engine=engine))
 
-	def from_elastic_tabstops(self):
-		return Table(_from_elastic_tabstops(self.string))
+	def from_elastic_tabstops(self, limits=None, engine=None):
+		return Table(_from_elastic_tabstops(self.string, limits=limits, engine=engine))
 
-	def from_fixed_tabstops(self, tab_width=8):
-		return Table(_from_fixed_tabstops(self.string, tab_width))
+	def from_fixed_tabstops(self, tab_width=8, indent_only=False, limits=None, cache=None, engine=None):
+		return Table(_from_fixed_tabstops(self.string, tab_width, indent_only=indent_only, limits=limits, cache=cache, engine=engine))
+
+	def is_aligned_spaces(self, tab_width=8, multiples_of_tab_width=False):
+		"""Check whether the text is already spaces aligned, stopping at the first misaligned column block without building any output."""
+		return _is_aligned_spaces(self.string, tab_width, multiples_of_tab_width)
+
+	def is_canonical_elastic(self, tab_width=8, multiples_of_tab_width=False):
+		"""Check whether the text is elastic tabstops aligned text which converting to spaces and back leaves unchanged (see _is_canonical_elastic())."""
+		return _is_canonical_elastic(self.string, tab_width, multiples_of_tab_width)
+
+	def realign_diff(self, tab_width=8, multiples_of_tab_width=False):
+		"""Realign spaces aligned text, returning only the changed line ranges (see Table.to_spaces_diff())."""
+		return self.from_spaces(tab_width).to_spaces_diff(self.string, tab_width, multiples_of_tab_width)
 
 
 class Table(Sequence):
-	__slots__ = ['list']
+	__slots__ = ['_list', 'lengths']
 
 	def __init__(self, val):
 		self.check(val)
-		self.list = val
+		self._list = val
+		# the length of each cell's text, if it was computed while the table was built by one of the class methods below
+		self.lengths = None
+
+	@property
+	def list(self):
+		"""The rows of the table. As they could be modified through this, any cell lengths computed when the table was built are forgotten."""
+		self.lengths = None
+		return self._list
+
+	@list.setter
+	def list(self, val):
+		self._list = val
+		self.lengths = None
+
+	@classmethod
+	def _from_rows(cls, rows, lengths):
+		table = cls(rows)
+		table.lengths = lengths
+		return table
+
+	@classmethod
+	def open_elastic(cls, path, encoding='utf-8'):
+		"""Create a table from an elastic tabstops aligned file which is memory-mapped, only splitting rows into cells when they're accessed.
+
+		Conversions of the whole table read the rows lazily (converting to spaces takes two passes over them).
+		Close the table (or use it in a with statement) to unmap the file.
+		"""
+		return cls(MappedElasticRows(path, encoding))
+
+	def close(self):
+		"""Unmap the file, if the table was opened with open_elastic()."""
+		if isinstance(self._list, MappedElasticRows):
+			self._list.close()
+
+	def __enter__(self): return self
+
+	def __exit__(self, *exc_info): self.close()
+
+	@classmethod
+	def from_records(cls, records, columns=None, fmt=None, header=False):
+		"""Create a table from an iterable of sequences or mappings of values.
+
+		columns picks the keys used for mappings (by default the keys of the first record), and header adds them as the first row.
+		fmt is a %-style format for all values or a sequence of formats (or Nones) for each column, in which case every
+		record should have a value for each format. Values are formatted with str() by default and None becomes ''.
+		"""
+
+		fmts = itertools.repeat(fmt) if isinstance(fmt, str) else fmt
+		rows = []
+		lengths = []
+		for record in records:
+			if isinstance(record, Mapping):
+				if columns is None:
+					columns = list(record)
+				record = [record.get(column) for column in columns]
+			if fmt is not None and not isinstance(fmt, str) and len(record) != len(fmt):
+				raise ValueError("The fmt parameter of from_records has %d formats but a record has %d values." % (len(fmt), len(record)))
+			row = _format_row(record, fmts)
+			rows.append(row)
+			lengths.append(list(map(len, row)))
+		if header:
+			if columns is None:
+				raise ValueError("The columns parameter of from_records is needed to add a header.")
+			row = list(map(str, columns))
+			rows.insert(0, row)
+			lengths.insert(0, list(map(len, row)))
+		return cls._from_rows(rows, lengths)
+
+	@classmethod
+	def from_csv(cls, path_or_fp, encoding='utf-8', **fmtparams):
+		"""Create a table from CSV read from a file path or a text stream, using the csv module's format parameters."""
+
+		if isinstance(path_or_fp, str):
+			with open(path_or_fp, 'r', encoding=encoding, newline='') as fp:
+				return cls.from_csv(fp, encoding, **fmtparams)
+		rows = []
+		lengths = []
+		for row in csv.reader(path_or_fp, **fmtparams):
+			rows.append(row)
+			lengths.append(list(map(len, row)))
+		return cls._from_rows(rows, lengths)
+
+	@classmethod
+	def from_array(cls, values, fmt=None):
+		"""Create a table from a 2D NumPy array (or a sequence of sequences) of values.
+
+		fmt is as for from_records(). NumPy arrays are formatted a whole column at a time, except for arrays of objects
+		which are formatted like records (so that None becomes '').
+		"""
+
+		if not _is_ndarray(values):
+			return cls.from_records(values, fmt=fmt)
+		if values.ndim != 2:
+			raise ValueError("The first parameter of from_array ('values') should be a 2D array.")
+		if fmt is not None and not isinstance(fmt, str) and len(fmt) != values.shape[1]:
+			raise ValueError("The fmt parameter of from_array has %d formats but the array has %d columns." % (len(fmt), values.shape[1]))
+		if values.dtype == object:
+			return cls.from_records(values.tolist(), fmt=fmt)
+		rows, lengths = _format_array(values, fmt)
+		return cls._from_rows(rows, lengths)
 
 	def check(self, val):
+		if isinstance(val, MappedElasticRows):
+			# rows are only read when they're accessed
+			return
 		if not isinstance(val, list) or len(val) == 0 or any([not isinstance(i, list) or any([not isinstance(j, str) for j in i]) for i in val]):
 			raise TypeError(("Expected a list of lists of strings (but got %s)." % val))
 
-	def __len__(self): return len(self.list)
+	def __len__(self): return len(self._list)
 
-	def __getitem__(self, i): return self.list[i]
+	def __getitem__(self, i):
+		# rows handed out could be modified, so the cell lengths can't be trusted any more
+		self.lengths = None
+		return self._list[i]
 
-	def __str__(self): return str(self.list)
+	def __str__(self): return str(self._list)
 
-	def __repr__(self): return self.list.__repr__()
+	def __repr__(self): return self._list.__repr__()
 
 	def __eq__(self, other):
 		if isinstance(other, self.__class__):
-			return self.list == other.list
+			return self._list == other._list
 		elif isinstance(other, list):
-			return self.list == other
+			return self._list == other
 		else:
 			return False
 
 	def __ne__(self, other): return not self.__eq__(other)
 
-	def to_spaces(self, tab_width=8, multiples_of_tab_width=False):
-		return Text(_to_spaces(self.list, tab_width, multiples_of_tab_width=multiples_of_tab_width))
+	def to_spaces(self, tab_width=8, multiples_of_tab_width=False, indent_only=False, limits=None, max_column_width=None, overflow='truncate', processes=None, layout=None, engine=None):
+		return Text(_to_spaces(self._list, tab_width, multiples_of_tab_width=multiples_of_tab_width, lengths=self.lengths, indent_only=indent_only, limits=limits, max_column_width=max_column_width, overflow=overflow, processes=processes, layout=layout, engine=engine))
+
+	def to_spaces_multi(self, tab_widths, multiples_of_tab_width=False):
+		"""Convert to spaces aligned text at each of several tab widths, returning a dict of tab width to Text."""
+		return dict([(tab_width, Text(text)) for tab_width, text in _to_spaces_multi(self._list, tab_widths, multiples_of_tab_width, self.lengths).items()])
+
+	def to_spaces_diff(self, original_text, tab_width=8, multiples_of_tab_width=False):
+		"""Convert to spaces aligned text, returning only the lines which differ from original_text.
+
+		The result is a list of LineChange(start, stop, lines) named tuples in ascending order, each replacing the
+		original lines from start up to stop with lines. Unchanged lines are checked without rendering them.
+		"""
+		if isinstance(original_text, Text):
+			original_text = original_text.string
+		return _to_spaces_diff(self._list, original_text, tab_width, multiples_of_tab_width=multiples_of_tab_width, lengths=self.lengths)
+
+	def render_window(self, start, stop, tab_width=8, multiples_of_tab_width=False):
+		"""Return a list of the spaces aligned lines from start up to (but not including) stop.
+
+		Only the column blocks which overlap the window are measured, so the cost doesn't depend on the size of the rest of the table.
+		"""
+		return _render_window(self._list, start, stop, tab_width, multiples_of_tab_width)
+
+	def to_elastic_tabstops(self, engine=None):
+		return Text(_to_elastic_tabstops(self._list, engine=engine))
+
+	def to_fixed_tabstops(self, tab_width=8, indent_only=False, limits=None, max_column_width=None, overflow='truncate', engine=None):
+		return Text(_to_fixed_tabstops(self._list, tab_width, indent_only=indent_only, limits=limits, max_column_width=max_column_width, overflow=overflow, engine=engine))
+
+	def to_fixed_tabstops_multi(self, tab_widths):
+		"""Convert to fixed tabstops aligned text at each of several tab widths, returning a dict of tab width to Text."""
+		return dict([(tab_width, Text(text)) for tab_width, text in _to_fixed_tabstops_multi(self._list, tab_widths, self.lengths).items()])
+
+
+class _LiveBlock(object):
+	"""A column block of a LiveTable."""
+
+	__slots__ = ['start', 'width']
+
+	def __init__(self, start, width):
+		self.start = start
+		self.width = width
+
+
+class LiveTable(object):
+	"""A table which is converted to spaces aligned text a row at a time as rows are appended (eg. for tail -f style output).
+
+	Only the rows in column blocks which are still open are kept, as they're the only lines which may need to be re-emitted.
+	"""
+
+	__slots__ = ['tab_width', 'multiples_of_tab_width', 'nof_lines', '_open_blocks', '_rows', '_rows_start']
+
+	def __init__(self, tab_width=8, multiples_of_tab_width=False):
+		if not isinstance(tab_width, int):
+			raise TypeError("The first parameter of LiveTable ('tab_width') should be an integer.")
+		if tab_width < 2:
+			raise ValueError("The first parameter of LiveTable ('tab_width') should be 2 or greater.")
+		self.tab_width = tab_width
+		self.multiples_of_tab_width = multiples_of_tab_width
+		self.nof_lines = 0
+		# the open block of each column (blocks are nested, so this is always a prefix of the columns)
+		self._open_blocks = []
+		# (row, blocks of its terminated cells) for each line from _rows_start onwards
+		self._rows = []
+		self._rows_start = 0
+
+	def append(self, row):
+		"""Add a row, returning a list of (line number, text) pairs for the new line and any earlier lines which need re-emitting because a block they're in got wider.
+
+		Re-emitted lines always run from the earliest widened block to the new line.
+		"""
+
+		if not isinstance(row, list) or any([not isinstance(cell, str) for cell in row]):
+			raise TypeError("Expected a list of strings (but got %s)." % row)
+
+		line_num = self.nof_lines
+		nof_terminated = max(len(row) - 1, 0)
+		open_blocks = self._open_blocks
+		del open_blocks[nof_terminated:]
+
+		first_changed_line_num = line_num
+		for cell_num in range(nof_terminated):
+			size = _min_cell_width(len(row[cell_num]), self.tab_width, self.multiples_of_tab_width)
+			if cell_num < len(open_blocks):
+				block = open_blocks[cell_num]
+				if size > block.width:
+					block.width = size
+					first_changed_line_num = min(first_changed_line_num, block.start)
+			else:
+				open_blocks.append(_LiveBlock(line_num, size))
+
+		# forget lines which can't change any more
+		keep_from = open_blocks[0].start if open_blocks else line_num
+		del self._rows[:keep_from - self._rows_start]
+		self._rows_start = keep_from
+		self._rows.append((row, open_blocks[:nof_terminated]))
+		self.nof_lines += 1
+
+		return [(changed_line_num, self._render(*self._rows[changed_line_num - self._rows_start])) for changed_line_num in range(first_changed_line_num, line_num + 1)]
+
+	@staticmethod
+	def _render(row, blocks):
+		parts = []
+		for cell_num, block in enumerate(blocks):
+			parts.append(row[cell_num])
+			parts.append(' ' * (block.width - len(row[cell_num])))
+		if len(row) > 0:
+			parts.append(row[-1])
+		return ''.join(parts)
+
+
+class TableFormatter(object):
+	"""A converter of tables to spaces aligned text for rendering many small tables with the same settings quickly.
+
+	Unlike Table.to_spaces(), no SizedText objects are made: each cell's column block is found in a single pass,
+	padding strings and block widths are looked up in lists which are made once (for cells up to
+	MAX_LOOKUP_LENGTH long, so that a very long cell doesn't make them huge), and the work lists are reused.
+	If trusted is set, rows aren't checked to be lists of strings. A formatter shouldn't be shared between threads,
+	as calls on different threads would use the same work lists.
+	"""
+
+	__slots__ = ['tab_width', 'multiples_of_tab_width', 'trusted', '_widths', '_spaces', '_open_blocks', '_max_lengths', '_block_nums']
+
+	MAX_LOOKUP_LENGTH = 256
+
+	def __init__(self, tab_width=8, multiples_of_tab_width=False, trusted=False):
+		if not isinstance(tab_width, int):
+			raise TypeError("The first parameter of TableFormatter ('tab_width') should be an integer.")
+		if tab_width < 2:
+			raise ValueError("The first parameter of TableFormatter ('tab_width') should be 2 or greater.")
+		self.tab_width = tab_width
+		self.multiples_of_tab_width = multiples_of_tab_width
+		self.trusted = trusted
+		# the width of a block by the length of its longest cell, and strings of spaces by their length
+		self._widths = [_min_cell_width(length, tab_width, multiples_of_tab_width) for length in range(self.MAX_LOOKUP_LENGTH)]
+		self._spaces = [' ' * nof_spaces for nof_spaces in range(self.MAX_LOOKUP_LENGTH)]
+		# the block of each column open at the current line, the longest cell length of each block, and the block of each terminated cell
+		self._open_blocks = []
+		self._max_lengths = []
+		self._block_nums = []
+
+	def format(self, rows):
+		"""Return rows (a Table or list of lists of strings) as spaces aligned text, the same as Table(rows).to_spaces() would."""
+
+		rows = getattr(rows, 'list', rows)
+		if not self.trusted and (not isinstance(rows, list) or any([not isinstance(row, list) or any([not isinstance(cell, str) for cell in row]) for row in rows])):
+			raise TypeError("Expected a list of lists of strings (but got %s)." % rows)
 
-	def to_elastic_tabstops(self):
-		return Text(_to_elastic_tabstops(self.list))
+		open_blocks = self._open_blocks
+		max_lengths = self._max_lengths
+		block_nums = self._block_nums
+		del open_blocks[:]
+		del max_lengths[:]
+		del block_nums[:]
+		for row in rows:
+			nof_terminated = len(row) - 1
+			if nof_terminated < 1:
+				del open_blocks[:]
+				continue
+			del open_blocks[nof_terminated:]
+			for cell_num in range(nof_terminated):
+				length = len(row[cell_num])
+				if cell_num < len(open_blocks):
+					block_num = open_blocks[cell_num]
+					if length > max_lengths[block_num]:
+						max_lengths[block_num] = length
+				else:
+					block_num = len(max_lengths)
+					open_blocks.append(block_num)
+					max_lengths.append(length)
+				block_nums.append(block_num)
 
-	def to_fixed_tabstops(self, tab_width=8):
-		return Text(_to_fixed_tabstops(self.list, tab_width))
+		widths = self._widths
+		block_widths = [widths[length] if length < self.MAX_LOOKUP_LENGTH else _min_cell_width(length, self.tab_width, self.multiples_of_tab_width) for length in max_lengths]
+		spaces = self._spaces
+		lines = []
+		cell_index = 0
+		for row in rows:
+			if len(row) < 2:
+				lines.append(row[0] if row else '')
+				continue
+			parts = []
+			for cell in row[:-1]:
+				parts.append(cell)
+				nof_spaces = block_widths[block_nums[cell_index]] - len(cell)
+				parts.append(spaces[nof_spaces] if nof_spaces < self.MAX_LOOKUP_LENGTH else ' ' * nof_spaces)
+				cell_index += 1
+			parts.append(row[-1])
+			lines.append(''.join(parts))
+		return '\n'.join(lines)
@@ -0,0 +1,166 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""Command line interface, run as: python -m elastictabstops <command> ..."""
+
+import argparse
+import logging
+import sys
+
+from elastictabstops.engine import select_engine
+from elastictabstops.operations import FORMATS, OPERATIONS, convert_text, is_converted
+from elastictabstops.runner import DEFAULT_MAX_CACHE_SIZE, ResultCache, run, staged_files
+from elastictabstops.stream import elastic_tabstops_to_spaces, open_text
+
+
+def _read(path):
+	if path == '-':
+		return sys.stdin.read()
+	with open_text(path) as fp:
+		return fp.read()
+
+
+def _write(path, text):
+	if path == '-':
+		sys.stdout.write(text)
+		return
+	with open_text(path, 'w') as fp:
+		fp.write(text)
+
+
+def _convert(args):
+	paths = args.files or ['-']
+	if args.check:
+		# report files which aren't already in the canonical form of the format we'd convert to
+		status = 0
+		for path in paths:
+			if not is_converted(_read(path), args.to_format, args.tab_width, args.multiples_of_tab_width):
+				sys.stderr.write('would realign %s\n' % path)
+				status = 1
+		return status
+
+	op = '%s_to_%s' % (args.from_format, args.to_format)
+	out_fp = open_text(args.output, 'w') if args.output else sys.stdout
+	try:
+		for path in paths:
+			if args.in_place:
+				_write(path, convert_text(_read(path), op, args.tab_width, args.multiples_of_tab_width, args.engine))
+			elif op == 'elastic_tabstops_to_spaces' and path != '-' and args.engine != 'serial':
+				# streamed in two passes so that large (and compressed) files aren't held in memory
+				select_engine('to_spaces', args.engine or 'streaming', None)
+				elastic_tabstops_to_spaces(path, out_fp, args.tab_width, args.multiples_of_tab_width)
+			else:
+				out_fp.write(convert_text(_read(path), op, args.tab_width, args.multiples_of_tab_width, args.engine))
+	finally:
+		if args.output:
+			out_fp.close()
+	return 0
+
+
+def _run(args):
+	cache = None if args.no_cache else ResultCache(args.cache_dir, args.max_cache_size)
+	# with no files given, the staged content of the files staged in git is converted and staged
+	paths = args.files or staged_files()
+	changed_paths = run(paths, args.op, args.tab_width, args.multiples_of_tab_width, cache=cache, check=args.check, staged=not args.files)
+	for path in changed_paths:
+		sys.stderr.write('%s %s\n' % ('would realign' if args.check else 'realigned', path))
+	return 1 if changed_paths else 0
+
+
+def _prune_cache(args):
+	nof_deleted = ResultCache(args.cache_dir).prune(args.max_cache_size)
+	sys.stderr.write('deleted %d cache entries\n' % nof_deleted)
+	return 0
+
+
+def _serve(args):
+	from elastictabstops.server import serve
+	serve(args.socket)
+	return 0
+
+
+def _git_filter(args):
+	from elastictabstops.gitfilter import run_filter
+	run_filter(sys.stdin.buffer, sys.stdout.buffer, args.tab_width, args.multiples_of_tab_width)
+	return 0
+
+
+def _calibrate(args):
+	from elastictabstops.engine import calibrate, save_profile
+	profile = calibrate(args.large_cells)
+	path = save_profile(profile, args.output)
+	for kind in ('from_spaces', 'to_spaces'):
+		for engine, costs in sorted(profile[kind].items()):
+			if costs is not None:
+				sys.stderr.write('%s %s: %s\n' % (kind, engine, ', '.join(['%.3g' % cost for cost in costs])))
+	sys.stderr.write('wrote %s\n' % path)
+	return 0
+
+
+def _make_parser():
+	parser = argparse.ArgumentParser(prog='python -m elastictabstops', description='Converts text indented/aligned with elastic tabstops.')
+	parser.add_argument('-v', '--verbose', action='store_true', help='log details of conversions, such as the engines chosen, to stderr')
+	subparsers = parser.add_subparsers(dest='command')
+	subparsers.required = True
+
+	convert_parser = subparsers.add_parser('convert', help='convert files (or stdin) between formats')
+	convert_parser.add_argument('--from', dest='from_format', choices=FORMATS, help='format of the input (not needed with --check)')
+	convert_parser.add_argument('--to', dest='to_format', choices=FORMATS, required=True, help='format to convert to')
+	convert_parser.add_argument('-t', '--tab-width', type=int, default=8, help='tab width (default: 8)')
+	convert_parser.add_argument('--multiples-of-tab-width', action='store_true', help='align spaces at multiples of the tab width')
+	group = convert_parser.add_mutually_exclusive_group()
+	group.add_argument('--check', action='store_true', help="don't write anything, just exit with status 1 if any input isn't already in the --to format")
+	group.add_argument('-i', '--in-place', action='store_true', help='overwrite files with their converted text rather than writing to stdout')
+	group.add_argument('-o', '--output', metavar='FILE', help='write the converted text to FILE rather than stdout (compressed if it ends in .gz, .bz2 or .xz)')
+	convert_parser.add_argument('--engine', choices=('auto', 'serial'), help="'auto' to choose the fastest engine for each file using the calibrated profile (see calibrate), 'serial' to hold files being converted from elastic tabstops to spaces in memory rather than streaming them")
+	convert_parser.add_argument('files', nargs='*', metavar='FILE', help="files to convert ('-' or none for stdin), which may be gzip, bz2 or xz compressed")
+	convert_parser.set_defaults(func=_convert)
+
+	run_parser = subparsers.add_parser('run', help='convert the files staged in a git repository in place (eg. from a pre-commit hook), caching results')
+	run_parser.add_argument('--op', choices=OPERATIONS, required=True, help='conversion to run')
+	run_parser.add_argument('-t', '--tab-width', type=int, default=8, help='tab width (default: 8)')
+	run_parser.add_argument('--multiples-of-tab-width', action='store_true', help='align spaces at multiples of the tab width')
+	run_parser.add_argument('--check', action='store_true', help="don't write anything, just exit with status 1 if any file would change")
+	run_parser.add_argument('--no-cache', action='store_true', help="don't read or write the result cache")
+	run_parser.add_argument('--cache-dir', help='directory of the result cache (default: elastictabstops-cache in the git directory)')
+	run_parser.add_argument('--max-cache-size', type=int, default=DEFAULT_MAX_CACHE_SIZE, metavar='BYTES', help='size the cache is pruned to after adding results (default: %(default)s)')
+	run_parser.add_argument('files', nargs='*', metavar='FILE', help='files to convert (default: the files staged in git, whose staged content is converted and staged)')
+	run_parser.set_defaults(func=_run)
+
+	prune_parser = subparsers.add_parser('prune-cache', help="delete the least recently used entries from run's result cache")
+	prune_parser.add_argument('--cache-dir', help='directory of the result cache (default: elastictabstops-cache in the git directory)')
+	prune_parser.add_argument('--max-cache-size', type=int, default=DEFAULT_MAX_CACHE_SIZE, metavar='BYTES', help='size to prune the cache to (default: %(default)s)')
+	prune_parser.set_defaults(func=_prune_cache)
+
+	serve_parser = subparsers.add_parser('serve', help='serve conversion requests over a Unix domain socket')
+	serve_parser.add_argument('--socket', required=True, metavar='PATH', help='path of the socket to listen on')
+	serve_parser.set_defaults(func=_serve)
+
+	git_filter_parser = subparsers.add_parser('git-filter', help="run as a git long-running filter process (filter.<driver>.process), cleaning to spaces and smudging to elastic tabstops")
+	git_filter_parser.add_argument('-t', '--tab-width', type=int, default=8, help='tab width (default: 8)')
+	git_filter_parser.add_argument('--multiples-of-tab-width', action='store_true', help='align spaces at multiples of the tab width')
+	git_filter_parser.set_defaults(func=_git_filter)
+
+	calibrate_parser = subparsers.add_parser('calibrate', help="time the conversion engines on this machine and write the profile which engine='auto' uses")
+	calibrate_parser.add_argument('-o', '--output', metavar='FILE', help='where to write the profile (default: $ELASTICTABSTOPS_PROFILE or ~/.elastictabstops-profile.json)')
+	calibrate_parser.add_argument('--large-cells', type=int, default=20000, metavar='N', help='number of cells in the large tables timed (default: %(default)s)')
+	calibrate_parser.set_defaults(func=_calibrate)
+
+	return parser
+
+
+def main(argv=None):
+	"""Run the command line interface and return the exit status."""
+
+	parser = _make_parser()
+	args = parser.parse_args(argv)
+	if args.command == 'convert' and not args.check and args.from_format is None:
+		parser.error('the --from argument is required unless --check is used')
+	if args.verbose:
+		logging.basicConfig(format='%(name)s: %(message)s', level=logging.DEBUG)
+	return args.func(args)
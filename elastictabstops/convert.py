@@ -6,28 +6,41 @@
 #  * it doesn't follow the Maximum Line Length rule
 # use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
 
-from collections import namedtuple
+from array import array
+from collections import namedtuple, OrderedDict
+from collections.abc import Sequence
 import math
 import re
+import sys
+import threading
 
 # This code can be used to convert large amounts of text, so performance matters.
 # For this reason we use namedtuples and __slots__ to create readable but well-performing data structures.
 
 PositionedText = namedtuple('PositionedText', ['text', 'position'])
+LineChange = namedtuple('LineChange', ['start', 'stop', 'lines'])
+
+# Optional limits on the size of the input which, when exceeded, make a conversion raise a ValueError rather than
+# spending a long time (or a lot of memory) on text which is probably not meant to be aligned, eg. minified code.
+# A limit of None means no limit.
+Limits = namedtuple('Limits', ['max_line_length', 'max_cells_per_line', 'max_inserted_cells'])
+Limits.__new__.__defaults__ = (None, None, None)
+
+# what to do with cells longer than max_column_width (see _to_spaces())
+OVERFLOW_POLICIES = ('truncate', 'wrap', 'exclude')
+TRUNCATION_MARKER = '\u2026'
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'max_size', 'size'])
 
 class SizedText(object):
 	"""Class used to store text and the width of the cell it's in."""
 
 	__slots__ = ['text', 'size']
 
-	def __init__(self, text, tab_width, multiples_of_tab_width):
+	def __init__(self, text, tab_width, multiples_of_tab_width, length=None):
 		self.text = text
 		# size initially stores the minimum width of the cell
-		# we add two to provide padding - one is not enough as it could be confused for a non-aligning space
-		if multiples_of_tab_width:
-			self.size = int((math.ceil((len(self.text) + 2) / float(tab_width)))) * tab_width
-		else:
-			self.size = max(len(self.text) + 2, tab_width)
+		self.size = _min_cell_width(len(self.text) if length is None else length, tab_width, multiples_of_tab_width)
 
 	def get_padded_text(self):
 		"""Returns self.text plus spaces to match the number of characters in self.size."""
@@ -36,6 +49,22 @@ class SizedText(object):
 		return self.text + (' ' * nof_spaces)
 
 
+def _min_cell_width(length, tab_width, multiples_of_tab_width):
+	"""Return the minimum width of a cell containing text of the given length."""
+
+	# we add two to provide padding - one is not enough as it could be confused for a non-aligning space
+	if multiples_of_tab_width:
+		return int((math.ceil((length + 2) / float(tab_width)))) * tab_width
+	else:
+		return max(length + 2, tab_width)
+
+
+def _is_table(table):
+	"""Check that table is a list of rows, or a sequence which reads its rows lazily (such as stream.MappedElasticRows)."""
+
+	return isinstance(table, list) or (isinstance(table, Sequence) and not isinstance(table, str))
+
+
 def _cell_exists(list_of_lists, line_num, cell_num):
 	"""Check that an item exists in a list of lists."""
 
@@ -45,33 +74,114 @@ def _cell_exists(list_of_lists, line_num, cell_num):
 def _sub_tabs(line, tab_width, repl_char):
 	"""Return a line of text where tab characters have been substituted with the correct number of replacement characters."""
 
-	str_list = []
-	pos = 0
-	for char in line:
-		if char == '\t':
-			expand = tab_width - (pos % tab_width)
-			str_list.append(expand * repl_char)
-			pos += expand
-		else:
-			str_list.append(char)
-			pos += 1
+	parts = line.split('\t')
+	str_list = [parts[0]]
+	pos = len(parts[0])
+	for part in parts[1:]:
+		expand = tab_width - (pos % tab_width)
+		str_list.append(expand * repl_char)
+		str_list.append(part)
+		pos += expand + len(part)
 	return ''.join(str_list)
 
 
+# the 'substitute character' in unicode, used in place of the spaces that tabs expand to
+REPL_CHAR = '\x1a'
+
+# Look for a char that is (not a space or \x1a) followed by any number of chars that are either (not a space or \x1a) or a space followed by (not a space or \x1a)
+# This allows the substrings to have spaces, but only if that space is followed by a non-space char
+CELL_REGEX = re.compile(r'[^%(repl_char)s\s](?:[^%(repl_char)s\s]|\s(?=[^%(repl_char)s\s]))*' % {'repl_char': REPL_CHAR})
+
+
+def _iter_lines(text):
+	"""Yield the lines of text one at a time (like text.split('\n') but without building a list of them all)."""
+
+	start = 0
+	end = text.find('\n')
+	while end != -1:
+		yield text[start:end]
+		start = end + 1
+		end = text.find('\n', start)
+	yield text[start:]
+
+
+def _tokenize_line(line, tab_width, expand_tabs=False):
+	"""Return a list of the texts of the cells in a line of spaces aligned text, and an array of their positions.
+
+	Tabs are treated as separating cells, unless expand_tabs is set in which case they are expanded to spaces first.
+	"""
+
+	if '\t' in line:
+		line = line.expandtabs(tab_width) if expand_tabs else _sub_tabs(line, tab_width, REPL_CHAR)
+	texts = []
+	positions = array('l')
+	for match in CELL_REGEX.finditer(line):
+		texts.append(match.group())
+		positions.append(match.start())
+	return texts, positions
+
+
+class TokenCache(object):
+	"""A least recently used cache of tokenized lines, which can be shared between conversions of text that mostly stays the same (eg. an editor's buffer).
+
+	Lines are keyed by their text and the tab width, so only new or changed lines are tokenized again. It's safe to share between threads.
+	"""
+
+	__slots__ = ['max_size', 'hits', 'misses', '_entries', '_lock']
+
+	def __init__(self, max_size=10000):
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+
+	def tokenize(self, line, tab_width, expand_tabs=False):
+		"""Return what _tokenize_line() would, from the cache if possible. The returned list and array must not be modified."""
+
+		key = (line, tab_width, expand_tabs)
+		with self._lock:
+			tokens = self._entries.get(key)
+			if tokens is not None:
+				self._entries.move_to_end(key)
+				self.hits += 1
+				return tokens
+			self.misses += 1
+
+		tokens = _tokenize_line(line, tab_width, expand_tabs)
+		with self._lock:
+			self._entries[key] = tokens
+			while len(self._entries) > self.max_size:
+				self._entries.popitem(last=False)
+		return tokens
+
+	def info(self):
+		"""Return a CacheInfo(hits, misses, max_size, size) named tuple."""
+
+		with self._lock:
+			return CacheInfo(self.hits, self.misses, self.max_size, len(self._entries))
+
+	def clear(self):
+		"""Empty the cache and reset its statistics."""
+
+		with self._lock:
+			self._entries.clear()
+			self.hits = 0
+			self.misses = 0
+
+
 def _get_positions_contents(text, tab_width):
 	"""Given a piece of text and how long tabs should be, return a list of lists of PositionedText named tuples."""
 
-	repl_char = '\x1a' # the 'substitute character' in unicode
-	text = '\n'.join([_sub_tabs(line, tab_width, repl_char) for line in text.split('\n')])
+	return [[PositionedText(cell_text, position) for cell_text, position in zip(*_tokenize_line(line, tab_width))] for line in _iter_lines(text)]
 
-	# Look for a char that is (not a space or \x1a) followed by any number of chars that are either (not a space or \x1a) or a space followed by (not a space or \x1a)
-	# This allows the substrings to have spaces, but only if that space is followed by a non-space char
-	compiled = re.compile(r'[^%(repl_char)s\s](?:[^%(repl_char)s\s]|\s(?=[^%(repl_char)s\s]))*' % {'repl_char': repl_char})
-	return [[PositionedText(match.group(), match.start()) for match in compiled.finditer(line)] for line in text.split('\n')]
 
+def _from_spaces(text, tab_width, indent_only=False, limits=None, cache=None, engine=None):
+	"""Convert spaces aligned text to table (or if indent_only is set, only convert indentation), within limits (a Limits) if given.
 
-def _from_spaces(text, tab_width):
-	"""Convert spaces aligned text to table."""
+	If given, cache is a TokenCache used to avoid tokenizing lines which were seen by earlier conversions.
+	If given, engine is 'auto' or one of engine.ENGINES['from_spaces'] ('cached' uses a new TokenCache if cache isn't given).
+	"""
 
 	if not isinstance(text, str):
 		raise TypeError("The first parameter of _from_spaces ('text') should be a string.")
@@ -80,93 +190,247 @@ def _from_spaces(text, tab_width):
 	if tab_width < 2:
 		raise ValueError("The second parameter of _from_spaces ('tab_width') should be 2 or greater.")
 
+	if indent_only:
+		return _table_from_indentation(text, tab_width)
+	if engine is not None and _select_engine('from_spaces', engine, text) == 'cached' and cache is None:
+		cache = TokenCache()
+	return _table_from_spaces(text, tab_width, limits=limits, cache=cache)
+
+
+def _table_from_indentation(text, tab_width):
+	"""Convert text to table, turning the leading whitespace of each line into empty cells and leaving the rest of the line as one cell."""
+
+	table = []
+	for line in _iter_lines(text):
+		content = line.lstrip(' \t')
+		if not content or content.isspace():
+			table.append([''])
+			continue
+		indent_width = len(line[:len(line) - len(content)].expandtabs(tab_width))
+		row = [''] * (indent_width // tab_width)
+		row.append(content)
+		table.append(row)
+	return table
+
+
+# how many cells a conversion step places between yields
+_CELLS_PER_STEP = 64
+# how many lines a conversion step splits or joins between yields
+_LINES_PER_STEP = 64
+
+
+def _finish(steps):
+	"""Run a generator of conversion steps (see _table_from_spaces_steps()) to the end and return its result."""
+
+	while True:
+		try:
+			next(steps)
+		except StopIteration as stop:
+			return stop.value
+
+
+def _table_from_spaces(text, tab_width, expand_tabs=False, limits=None, cache=None):
+	"""Convert spaces aligned text to table without checking the parameters (see _tokenize_line() for expand_tabs)."""
+
+	return _finish(_table_from_spaces_steps(text, tab_width, expand_tabs, limits, cache))
+
+
+def _table_from_spaces_steps(text, tab_width, expand_tabs=False, limits=None, cache=None):
+	"""Generator which does the work of _table_from_spaces() and returns the table.
+
+	It yields (work done, estimated total work) after each line is tokenized and after every _CELLS_PER_STEP cells
+	are placed, so that conversions can be run a little at a time (see job.ConversionJob).
+	"""
+
+	# estimated as a unit of work for each line and each cell, and updated as the real numbers become known
+	done = 0
+	total = 2 * (text.count('\n') + 1)
+
 	# '\r's before '\n's are just left at the end of lines
 	# solitary '\r's aren't dealt with as these days no one uses CRs on their own for new lines
-	lines = _get_positions_contents(text, tab_width)
-	max_cells = max([len(line) for line in lines])
-	nof_lines = len(lines)
+	# to keep peak memory down each line's cells are stored as a list of texts and a parallel array of positions
+	texts_lines = []
+	positions_lines = []
+	for line_num, line in enumerate(_iter_lines(text)):
+		if limits is not None:
+			_check_line_limits(limits, line_num, len(line))
+		if cache is None:
+			texts, positions = _tokenize_line(line, tab_width, expand_tabs)
+		else:
+			texts, positions = cache.tokenize(line, tab_width, expand_tabs)
+		if limits is not None:
+			_check_line_limits(limits, line_num, len(line), len(texts))
+		texts_lines.append(texts)
+		positions_lines.append(positions)
+		done += 1
+		yield done, total
+	nof_lines = len(texts_lines)
+	total = nof_lines + sum(map(len, texts_lines))
 
-	# not a "for cell_num in (range(max_cells)):" loop because max_cells may increase
+	# Rows are built a column at a time. A line's current cell is its next unused text, unless empty cells have been inserted in front of it.
+	# Only the lines which have a cell in the current column are visited, so the work done is proportional to the number of cells.
+	rows = [[] for _ in range(nof_lines)]
+	next_texts = [0] * nof_lines
+	# the number of empty indentation cells still to come before each line's next text
+	pending_empties = [0] * nof_lines
+	nof_inserted = 0
+	next_yield = done + _CELLS_PER_STEP
+	active = [line_num for line_num in range(nof_lines) if texts_lines[line_num]]
 	cell_num = 0
-	while cell_num < max_cells:
-		starting_new_block = True
-		start_range = 0
-		end_range = 0
-
-		for line_num in range(nof_lines + 1):
-			if _cell_exists(lines, line_num, cell_num):
-				# if we're at the start of a block remember what line we're on
-				if starting_new_block:
-					start_range = line_num
-					starting_new_block = False
-				end_range = line_num
-			# if there's no cell and we're not starting a block then we're at the end of a column block
-			elif not starting_new_block:
-				block_positions = [lines[block_line_num][cell_num].position for block_line_num in range(start_range, end_range + 1)]
-
-				min_indent = min(block_positions)
-
-				for block_line_offset, block_position in enumerate(block_positions):
-					block_line_num = start_range + block_line_offset
-					# if the current block is to the right we need to insert an empty cell
-					if block_position > min_indent:
-						# insert an empty cell to shift existing cells across
-						lines[block_line_num].insert(cell_num, PositionedText('', 0))
-						max_cells = max(max_cells, len(lines[block_line_num]))
-					# otherwise if we're in the first column we need to insert empty cells for every line in this block
-					elif cell_num == 0:
-						nof_cells_missing = int(block_position / tab_width)
-						for _ in range(nof_cells_missing):
-							# insert empty indentation cells
-							lines[block_line_num].insert(cell_num, PositionedText('', 0))
-							max_cells = max(max_cells, len(lines[block_line_num]))
-
-				starting_new_block = True
+	while active:
+		next_active = []
+		for start_index, stop_index in _consecutive_runs(active):
+			block_line_nums = active[start_index:stop_index]
+			min_indent = _min_indent(block_line_nums, positions_lines, next_texts, pending_empties)
+			# long blocks are placed _CELLS_PER_STEP lines at a time so that there's a chance to yield between them
+			for chunk_start in range(0, len(block_line_nums), _CELLS_PER_STEP):
+				chunk_line_nums = block_line_nums if len(block_line_nums) <= _CELLS_PER_STEP else block_line_nums[chunk_start:chunk_start + _CELLS_PER_STEP]
+				nof_inserted += _place_cells(chunk_line_nums, min_indent, cell_num, tab_width, texts_lines, positions_lines, next_texts, pending_empties, rows, next_active)
+				# yielding after every cell would make one-shot conversions measurably slower
+				done += len(chunk_line_nums)
+				if done >= next_yield:
+					yield done, total + nof_inserted
+					next_yield = done + _CELLS_PER_STEP
+
+			if limits is not None and limits.max_inserted_cells is not None and nof_inserted > limits.max_inserted_cells:
+				raise ValueError("More than %d empty cells would be inserted (max_inserted_cells)." % limits.max_inserted_cells)
 
+		active = next_active
 		cell_num += 1
 
-	return [([cell.text for cell in line] or ['']) for line in lines]
+	del texts_lines, positions_lines
+	for row in rows:
+		if not row:
+			row.append('')
+	return rows
+
 
+def _min_indent(line_nums, positions_lines, next_texts, pending_empties):
+	"""Return the position of the leftmost of the next cells of a run of lines being placed in a column (see _place_cells())."""
 
-def _to_elastic_tabstops(table):
-	"""Convert table to elastic tabstops aligned text."""
+	return min([0 if pending_empties[line_num] else positions_lines[line_num][next_texts[line_num]] for line_num in line_nums])
 
-	if not isinstance(table, list):
+
+def _place_cells(line_nums, min_indent, cell_num, tab_width, texts_lines, positions_lines, next_texts, pending_empties, rows, next_active):
+	"""Append the cells in column cell_num of lines in a run whose leftmost next cell is at min_indent to their rows, returning the number of empty cells inserted.
+
+	texts_lines and positions_lines are each line's tokenized cell texts and positions. The index of each line's next
+	unused text (next_texts) and the number of empty indentation cells still to come before it (pending_empties) are
+	updated, and the lines which will have another cell are appended to next_active.
+	"""
+
+	nof_inserted = 0
+	for line_num in line_nums:
+		block_position = 0 if pending_empties[line_num] else positions_lines[line_num][next_texts[line_num]]
+		# if the current block is to the right we need to insert an empty cell to shift existing cells across
+		if block_position > min_indent:
+			rows[line_num].append('')
+			nof_inserted += 1
+		# otherwise if we're in the first column we need to insert empty indentation cells for every line in this block
+		elif cell_num == 0 and block_position // tab_width > 0:
+			rows[line_num].append('')
+			pending_empties[line_num] = block_position // tab_width - 1
+			nof_inserted += block_position // tab_width
+		elif pending_empties[line_num]:
+			rows[line_num].append('')
+			pending_empties[line_num] -= 1
+		else:
+			rows[line_num].append(texts_lines[line_num][next_texts[line_num]])
+			next_texts[line_num] += 1
+		if pending_empties[line_num] or next_texts[line_num] < len(texts_lines[line_num]):
+			next_active.append(line_num)
+	return nof_inserted
+
+
+def _consecutive_runs(line_nums):
+	"""Yield the (start, stop) index ranges of the runs of consecutive numbers in a sorted list of line numbers."""
+
+	start_index = 0
+	for index in range(1, len(line_nums)):
+		if line_nums[index] != line_nums[index - 1] + 1:
+			yield start_index, index
+			start_index = index
+	if line_nums:
+		yield start_index, len(line_nums)
+
+
+def _check_line_limits(limits, line_num, line_length, nof_cells=0):
+	"""Raise a ValueError if a line is longer or has more cells than limits allows."""
+
+	if limits.max_line_length is not None and line_length > limits.max_line_length:
+		raise ValueError("Line %d is %d characters long, which is more than the limit of %d (max_line_length)." % (line_num, line_length, limits.max_line_length))
+	if limits.max_cells_per_line is not None and nof_cells > limits.max_cells_per_line:
+		raise ValueError("Line %d has %d cells, which is more than the limit of %d (max_cells_per_line)." % (line_num, nof_cells, limits.max_cells_per_line))
+
+
+def _check_table_limits(table, limits):
+	"""Raise a ValueError if any row of table is longer or has more cells than limits allows."""
+
+	for line_num, row in enumerate(table):
+		_check_line_limits(limits, line_num, sum(map(len, row)) + len(row) - 1, len(row))
+
+
+def _to_elastic_tabstops(table, engine=None):
+	"""Convert table to elastic tabstops aligned text, with engine ('auto' or 'serial') if given."""
+
+	if not _is_table(table):
 		raise TypeError("The first parameter of _to_elastic_tabstops ('table') should be a list.")
+	if engine is not None:
+		_select_engine('to_elastic_tabstops', engine, table)
 
-	return '\n'.join(['\t'.join(row) for row in table])
+	return _finish(_to_elastic_tabstops_steps(table))
 
 
-def _to_fixed_tabstops(table, tab_width):
-	"""Convert table to fixed tabstops aligned text."""
+def _to_fixed_tabstops(table, tab_width, indent_only=False, limits=None, max_column_width=None, overflow='truncate', engine=None):
+	"""Convert table to fixed tabstops aligned text (or if indent_only is set, only convert indentation), within limits (a Limits) if given.
 
-	if not isinstance(table, list):
+	See _to_spaces() for max_column_width, overflow and engine.
+	"""
+
+	if not _is_table(table):
 		raise TypeError("The first parameter of _to_fixed_tabstops ('table') should be a list.")
 	if not isinstance(tab_width, int):
 		raise TypeError("The second parameter of _to_fixed_tabstops ('tab_width') should be an integer .")
 	if tab_width < 2:
 		raise ValueError("The second parameter of _to_fixed_tabstops ('tab_width') should be 2 or greater.")
 
-	spaced_text = _to_spaces(table, tab_width, multiples_of_tab_width=True)
+	if indent_only:
+		return _indentation_to_text(table, '\t')
+
+	spaced_text = _to_spaces(table, tab_width, multiples_of_tab_width=True, limits=limits, max_column_width=max_column_width, overflow=overflow, engine=engine)
+	return _spaces_to_tabs(spaced_text, tab_width)
+
+
+def _spaces_to_tabs(spaced_text, tab_width):
+	"""Convert text aligned with spaces to multiples of tab_width to fixed tabstops aligned text."""
+
+	return _finish(_spaces_to_tabs_steps(spaced_text, tab_width))
 
-	lines = _get_positions_contents(spaced_text, tab_width)
 
+def _spaces_to_tabs_steps(spaced_text, tab_width):
+	"""Generator which does the work of _spaces_to_tabs() and returns the text, yielding (work done, total work) after each line."""
+
+	total = spaced_text.count('\n') + 1
 	tabbed_text = []
-	for line in lines:
+	for line in _iter_lines(spaced_text):
 		pos = 0
-		tabbed_line = ''
-		for cell in line:
-			gap = cell.position - pos
+		tabbed_line = []
+		for cell_text, position in zip(*_tokenize_line(line, tab_width)):
+			gap = position - pos
 			num_tabs = int(math.floor((gap + (tab_width - 1))/ tab_width))
-			num_spaces = cell.position % tab_width
-			tabbed_line += ('\t' * num_tabs) + (' ' * num_spaces) + cell.text
-			pos = cell.position + len(cell.text)
-		tabbed_text.append(tabbed_line)
+			num_spaces = position % tab_width
+			tabbed_line.append(('\t' * num_tabs) + (' ' * num_spaces) + cell_text)
+			pos = position + len(cell_text)
+		tabbed_text.append(''.join(tabbed_line))
+		yield len(tabbed_text), total
 	return '\n'.join(tabbed_text)
 
 
-def _from_fixed_tabstops(text, tab_width):
-	"""Convert fixed tabstops aligned text to table."""
+def _from_fixed_tabstops(text, tab_width, indent_only=False, limits=None, cache=None, engine=None):
+	"""Convert fixed tabstops aligned text to table (or if indent_only is set, only convert indentation), within limits (a Limits) if given.
+
+	See _from_spaces() for cache and engine.
+	"""
 
 	if not isinstance(text, str):
 		raise TypeError("The first parameter of _from_fixed_tabstops ('text') should be a string.")
@@ -175,70 +439,625 @@ def _from_fixed_tabstops(text, tab_width):
 	if tab_width < 2:
 		raise ValueError("The second parameter of _from_fixed_tabstops ('tab_width') should be 2 or greater.")
 
-	expanded = text.expandtabs(tab_width)
-	return _from_spaces(expanded, tab_width)
+	if indent_only:
+		return _table_from_indentation(text, tab_width)
+	if engine is not None and _select_engine('from_spaces', engine, text) == 'cached' and cache is None:
+		cache = TokenCache()
+	# tabs are expanded a line at a time rather than making an expanded copy of the whole text
+	return _table_from_spaces(text, tab_width, expand_tabs=True, limits=limits, cache=cache)
 
 
-def _from_elastic_tabstops(text):
-	"""Convert elastic tabstops aligned text to table."""
+def _from_elastic_tabstops(text, limits=None, engine=None):
+	"""Convert elastic tabstops aligned text to table, within limits (a Limits) if given, with engine ('auto' or 'serial') if given."""
 
 	if not isinstance(text, str):
 		raise TypeError("The first parameter of _from_elastic_tabstops ('text') should be a string.")
+	if engine is not None:
+		_select_engine('from_elastic_tabstops', engine, text)
 
 	# '\r's before '\n's are just left at the end of lines
 	# solitary '\r's aren't dealt with as these days no one uses CRs on their own for new lines
-	return [line.split('\t') for line in text.split('\n')]
+	if limits is not None:
+		# check each line before splitting it so that huge lines are rejected cheaply
+		for line_num, line in enumerate(_iter_lines(text)):
+			_check_line_limits(limits, line_num, len(line), line.count('\t') + 1)
+	return _finish(_from_elastic_tabstops_steps(text))
+
+
+def _from_elastic_tabstops_steps(text):
+	"""Generator which does the work of _from_elastic_tabstops() and returns the table, yielding (work done, total work) after every _LINES_PER_STEP lines."""
+
+	lines = text.split('\n')
+	table = []
+	for start in range(0, len(lines), _LINES_PER_STEP):
+		table.extend([line.split('\t') for line in lines[start:start + _LINES_PER_STEP]])
+		yield len(table), len(lines)
+	return table
 
 
-def _to_spaces(table, tab_width, multiples_of_tab_width=False):
-	"""Convert table to spaces aligned text."""
+def _to_elastic_tabstops_steps(table):
+	"""Generator which does the work of _to_elastic_tabstops() and returns the text, yielding (work done, total work) after every _LINES_PER_STEP lines."""
 
-	if not isinstance(table, list):
+	lines = []
+	for start in range(0, len(table), _LINES_PER_STEP):
+		lines.extend(['\t'.join(row) for row in table[start:start + _LINES_PER_STEP]])
+		yield len(lines), len(table)
+	return '\n'.join(lines)
+
+
+def _to_spaces(table, tab_width, multiples_of_tab_width=False, lengths=None, indent_only=False, limits=None, max_column_width=None, overflow='truncate', processes=None, layout=None, engine=None):
+	"""Convert table to spaces aligned text.
+
+	If given, lengths is a list of lists holding the length of each cell's text, computed when the table was built.
+	If indent_only is set, only each row's leading empty cells are converted (to tab_width spaces each) and the other cells are joined with tabs.
+	If given, limits (a Limits) is checked against each row before converting.
+	If max_column_width is given, no terminated cell's text counts as longer than that when sizing column blocks, and
+	longer cells are handled according to overflow (one of OVERFLOW_POLICIES): 'truncate' cuts them short, ending them
+	with TRUNCATION_MARKER, 'wrap' continues them on extra lines, and 'exclude' leaves them out of their block's width
+	so that they push the rest of their line to the right.
+	If processes is given, the column blocks of very wide tables are sized by that many worker processes (see parallel.py).
+	If layout (a snapshot.LayoutSnapshot of table) is given, the column blocks aren't worked out again, unless max_column_width is given.
+	A ValueError is raised if a row has a different number of terminated cells than the layout says.
+	Otherwise, if engine is given it's 'auto' or one of engine.ENGINES['to_spaces'] ('parallel' uses processes, or
+	a process per CPU), and it overrides processes.
+	"""
+
+	if not _is_table(table):
 		raise TypeError("The first parameter of _to_spaces ('table') should be a list.")
 	if not isinstance(tab_width, int):
 		raise TypeError("The second parameter of _to_spaces ('tab_width') should be an integer .")
 	if tab_width < 2:
 		raise ValueError("The second parameter of _to_spaces ('tab_width') should be 2 or greater.")
 
-	lines = [[SizedText(cell, tab_width, multiples_of_tab_width) for cell in row] for row in table]
-	max_cells = max([len(line) for line in lines])
-	nof_lines = len(lines)
-
-	for cell_num in range(max_cells):
-		starting_new_block = True
-		start_range = 0
-		end_range = 0
-		max_width = 0
-		for line_num in range(nof_lines):
-			# check if there's a cell to the right of this column (which means this cell ends in a tab) - we only care about terminated cells
-			if _cell_exists(lines, line_num, cell_num + 1):
-				# if we're at the start of a block remember what line we're on
-				if starting_new_block:
-					start_range = line_num
-					starting_new_block = False
-				# record the max width of the block so far
-				max_width = max(max_width, lines[line_num][cell_num].size)
-				end_range = line_num
-			# if the cell has not been terminated and we're not starting a block then we're at the end of a column block
-			elif not starting_new_block:
-				# iterate over all cells in the block and set their width to the max width
-				for block_line_num in range(start_range, end_range + 1):
-					lines[block_line_num][cell_num].size = max_width
-				starting_new_block = True
-				max_width = 0
-
-		# if we got to the last line without setting the size of the current block, do that now
-		if not starting_new_block:
-			for block_line_num in range(start_range, end_range + 1):
-				lines[block_line_num][cell_num].size = max_width
-
-	# append text and spaces to new_text
-	new_text = [''] * nof_lines
+	if max_column_width is not None:
+		if not isinstance(max_column_width, int):
+			raise TypeError("The max_column_width parameter of _to_spaces should be an integer.")
+		if max_column_width < 1:
+			raise ValueError("The max_column_width parameter of _to_spaces should be 1 or greater.")
+		if overflow not in OVERFLOW_POLICIES:
+			raise ValueError("The overflow parameter of _to_spaces should be one of %s." % ', '.join(OVERFLOW_POLICIES))
+
+	if limits is not None:
+		_check_table_limits(table, limits)
+	if indent_only:
+		return _indentation_to_text(table, ' ' * tab_width)
+	if max_column_width is not None:
+		return _capped_to_spaces(table, tab_width, multiples_of_tab_width, max_column_width, overflow)
+	if layout is not None:
+		if layout.nrows != len(table):
+			raise ValueError("The layout parameter of _to_spaces is the layout of a table with %d rows rather than %d." % (layout.nrows, len(table)))
+		return '\n'.join(_iter_block_padded_lines(table, layout.iter_block_nums(), layout.widths(tab_width, multiples_of_tab_width)))
+	if engine is not None:
+		engine = _select_engine('to_spaces', engine, table)
+	if engine == 'single_pass':
+		from elastictabstops.classes import TableFormatter
+		return TableFormatter(tab_width, multiples_of_tab_width, trusted=True).format(table)
+	if engine == 'parallel' or (engine is None and processes is not None and isinstance(table, list)):
+		from elastictabstops.parallel import _parallel_to_spaces
+		return _parallel_to_spaces(table, tab_width, multiples_of_tab_width, lengths, processes)
+	if engine == 'streaming' or not isinstance(table, list):
+		# rows which are read lazily are converted in two passes rather than all being held in memory at once
+		return '\n'.join(_iter_padded_lines(table, _block_widths(table, tab_width, multiples_of_tab_width)))
+
+	lines = _sized_lines(table, tab_width, multiples_of_tab_width, lengths)
+	_set_block_sizes(lines)
+	return '\n'.join([_padded_line(line) for line in lines])
+
+
+def _select_engine(kind, engine, data):
+	"""Return the engine to convert data with (see engine.select_engine())."""
+
+	from elastictabstops.engine import select_engine
+	return select_engine(kind, engine, data)
+
+
+def _to_spaces_steps(table, tab_width, multiples_of_tab_width=False, lengths=None):
+	"""Generator which does the work of _to_spaces() for a list table and returns the text.
+
+	It yields (work done, estimated total work) after each line is sized, each column block's width is set and each line is padded.
+	_to_spaces() itself doesn't use this as yielding so often makes it measurably slower.
+	"""
+
+	# estimated as two units of work for each line, and updated with the number of cells in blocks once it's known
+	done = 0
+	total = 2 * len(table)
+	lines = []
+	for line_num, row in enumerate(table):
+		lines.append(_sized_line(row, tab_width, multiples_of_tab_width, None if lengths is None else lengths[line_num]))
+		done += 1
+		yield done, total
+
+	total += sum([len(line) - 1 for line in lines if line])
+	for nof_cells in _set_block_sizes_steps(lines):
+		done += nof_cells
+		yield done, total
+
+	padded_lines = []
+	for line in lines:
+		padded_lines.append(_padded_line(line))
+		done += 1
+		yield done, total
+	return '\n'.join(padded_lines)
+
+
+def _capped_to_spaces(table, tab_width, multiples_of_tab_width, max_column_width, overflow):
+	"""Convert table to spaces aligned text with the width of column blocks capped (see _to_spaces() for the parameters)."""
+
+	if overflow == 'truncate':
+		table = [[_truncated(cell, max_column_width) for cell in row[:-1]] + row[-1:] for row in table]
+	lines = []
+	for row in table:
+		line = [SizedText(cell, tab_width, multiples_of_tab_width, min(len(cell), max_column_width)) for cell in row[:-1]]
+		if overflow == 'exclude':
+			for cell in line:
+				if len(cell.text) > max_column_width:
+					cell.size = _min_cell_width(0, tab_width, multiples_of_tab_width)
+		line.extend([SizedText(cell, tab_width, multiples_of_tab_width) for cell in row[-1:]])
+		lines.append(line)
+	_set_block_sizes(lines)
+
+	if overflow == 'wrap':
+		return '\n'.join([wrapped_line for line in lines for wrapped_line in _wrapped_lines(line, max_column_width)])
+	if overflow == 'exclude':
+		return '\n'.join([_excluded_padded_line(line, tab_width, multiples_of_tab_width) for line in lines])
+	return '\n'.join([_padded_line(line) for line in lines])
+
+
+def _excluded_padded_line(line, tab_width, multiples_of_tab_width):
+	"""Return the text of a line of sized cells like _padded_line(), but with cells which are too wide for their size pushing the rest of the line to the right."""
+
+	texts = []
+	pos = 0
+	for cell in line[:-1]:
+		# cells which are too wide still get the minimum gap after them, and the next cell stays on a tabstop
+		gap = max(cell.size - len(cell.text), 2)
+		if multiples_of_tab_width:
+			gap += -(pos + len(cell.text) + gap) % tab_width
+		texts.append(cell.text + ' ' * gap)
+		pos += len(cell.text) + gap
+	texts.extend([cell.text for cell in line[-1:]])
+	return ''.join(texts)
+
+
+def _truncated(text, max_length):
+	"""Return text, or if it's longer than max_length, as much of it as fits followed by TRUNCATION_MARKER."""
+
+	if len(text) <= max_length:
+		return text
+	return text[:max_length - len(TRUNCATION_MARKER)] + TRUNCATION_MARKER
+
+
+def _wrapped_lines(line, max_column_width):
+	"""Yield the text of a line of sized cells, continuing terminated cells longer than max_column_width on extra lines below it."""
+
+	if len(line) == 0:
+		yield ''
+		return
+	chunks = [[cell.text[start:start + max_column_width] for start in range(0, len(cell.text), max_column_width)] for cell in line[:-1]]
+	nof_lines = max([len(cell_chunks) for cell_chunks in chunks] + [1])
 	for line_num in range(nof_lines):
-		if len(lines[line_num]) > 0:
-			for cell_num in range(len(lines[line_num]) - 1):
-				new_text[line_num] += lines[line_num][cell_num].get_padded_text()
-			last_cell_num = len(lines[line_num]) - 1
-			new_text[line_num] += lines[line_num][last_cell_num].text
+		padded_cells = [(cell_chunks[line_num] if line_num < len(cell_chunks) else '').ljust(cell.size) for cell, cell_chunks in zip(line, chunks)]
+		if line_num == 0:
+			yield ''.join(padded_cells) + line[-1].text
+		else:
+			# continuation lines have nothing in their last cell, so they'd otherwise end with spaces
+			yield ''.join(padded_cells).rstrip(' ')
+
+
+def _to_spaces_multi(table, tab_widths, multiples_of_tab_width=False, lengths=None):
+	"""Convert table to spaces aligned text at each of several tab widths, returning a dict of tab width to text.
+
+	The column blocks and the longest cell in each are found once, as a cell's minimum width only depends on
+	its length and the tab width, so each tab width only costs the padding of the cells.
+	"""
+
+	if not _is_table(table):
+		raise TypeError("The first parameter of _to_spaces_multi ('table') should be a list.")
+	for tab_width in tab_widths:
+		if not isinstance(tab_width, int):
+			raise TypeError("The second parameter of _to_spaces_multi ('tab_widths') should be a list of integers.")
+		if tab_width < 2:
+			raise ValueError("The second parameter of _to_spaces_multi ('tab_widths') should only contain 2 or greater.")
+
+	block_nums, max_lengths = _block_structure(table, lengths)
+	texts = {}
+	for tab_width in tab_widths:
+		widths = [_min_cell_width(max_length, tab_width, multiples_of_tab_width) for max_length in max_lengths]
+		texts[tab_width] = '\n'.join(_iter_block_padded_lines(table, block_nums, widths))
+	return texts
+
+
+def _to_fixed_tabstops_multi(table, tab_widths, lengths=None):
+	"""Convert table to fixed tabstops aligned text at each of several tab widths, returning a dict of tab width to text."""
+
+	spaced_texts = _to_spaces_multi(table, tab_widths, multiples_of_tab_width=True, lengths=lengths)
+	return dict([(tab_width, _spaces_to_tabs(spaced_text, tab_width)) for tab_width, spaced_text in spaced_texts.items()])
+
 
+def _block_structure(table, lengths=None):
+	"""Return the number of the column block of every terminated cell of table (a list of arrays) and the length of the longest cell in each block."""
+
+	block_nums = [array('l', [0]) * (len(row) - 1) for row in table]
+	max_lengths = array('l')
+	for cell_num, start_range, stop_range in _column_blocks(table):
+		if lengths is None:
+			max_length = max([len(table[line_num][cell_num]) for line_num in range(start_range, stop_range)])
+		else:
+			max_length = max([lengths[line_num][cell_num] for line_num in range(start_range, stop_range)])
+		for line_num in range(start_range, stop_range):
+			block_nums[line_num][cell_num] = len(max_lengths)
+		max_lengths.append(max_length)
+	return block_nums, max_lengths
+
+
+def _iter_block_padded_lines(table, block_nums, widths):
+	"""Yield each row of table as text, with every terminated cell padded with spaces to the width of its column block.
+
+	Raises a ValueError if a row doesn't have a block number for each of its terminated cells (eg. if block_nums is
+	the layout of an older version of table).
+	"""
+
+	for line_num, (row, row_block_nums) in enumerate(zip(table, block_nums)):
+		if len(row_block_nums) != max(len(row) - 1, 0):
+			raise ValueError("The layout parameter of _to_spaces has %d terminated cells in row %d rather than %d." % (len(row_block_nums), line_num, max(len(row) - 1, 0)))
+		if len(row) == 0:
+			yield ''
+			continue
+		padded_cells = [cell + ' ' * (widths[block_num] - len(cell)) for cell, block_num in zip(row, row_block_nums)]
+		padded_cells.append(row[-1])
+		yield ''.join(padded_cells)
+
+
+def _indentation_to_text(table, indent):
+	"""Convert table to text, replacing each row's leading empty cells with indent and joining the other cells with tabs."""
+
+	new_text = []
+	for row in table:
+		# only terminated cells can be indentation
+		nof_indents = 0
+		while nof_indents < len(row) - 1 and row[nof_indents] == '':
+			nof_indents += 1
+		new_text.append(indent * nof_indents + '\t'.join(row[nof_indents:]))
 	return '\n'.join(new_text)
+
+
+def _sized_lines(table, tab_width, multiples_of_tab_width, lengths=None):
+	"""Return a list of lists of SizedText objects for the cells of a table, sized to their minimum widths."""
+
+	if lengths is None:
+		return [_sized_line(row, tab_width, multiples_of_tab_width) for row in table]
+	return [_sized_line(row, tab_width, multiples_of_tab_width, row_lengths) for row, row_lengths in zip(table, lengths)]
+
+
+def _sized_line(row, tab_width, multiples_of_tab_width, row_lengths=None):
+	"""Return a list of SizedText objects for the cells of a row, sized to their minimum widths."""
+
+	if row_lengths is None:
+		return [SizedText(cell, tab_width, multiples_of_tab_width) for cell in row]
+	return [SizedText(cell, tab_width, multiples_of_tab_width, length) for cell, length in zip(row, row_lengths)]
+
+
+def _set_block_sizes(lines):
+	"""Set the size of every terminated cell in lines of SizedText objects to the width of its column block."""
+
+	for _ in _set_block_sizes_steps(lines):
+		pass
+
+
+def _set_block_sizes_steps(lines):
+	"""Generator which does the work of _set_block_sizes(), yielding the number of cells in each column block after its cells' sizes are set."""
+
+	for cell_num, start_range, stop_range in _column_blocks(lines):
+		# find the max width of the block and set all its cells to it
+		max_width = max([lines[line_num][cell_num].size for line_num in range(start_range, stop_range)])
+		for line_num in range(start_range, stop_range):
+			lines[line_num][cell_num].size = max_width
+		yield stop_range - start_range
+
+
+def _column_blocks(lines):
+	"""Yield (cell number, start, stop) for the line ranges of every column block in lines of cells, a column at a time.
+
+	Only terminated cells (those with a cell to their right) are in blocks. Only the lines which have a terminated cell
+	in each column are visited, so the work done is proportional to the number of cells.
+	"""
+
+	active = [line_num for line_num, line in enumerate(lines) if len(line) > 1]
+	cell_num = 0
+	while active:
+		for start_index, stop_index in _consecutive_runs(active):
+			yield cell_num, active[start_index], active[stop_index - 1] + 1
+		cell_num += 1
+		active = [line_num for line_num in active if len(lines[line_num]) > cell_num + 1]
+
+
+def _padded_line(line):
+	"""Return the text of a line of sized cells with all but the last cell padded with spaces."""
+
+	if len(line) == 0:
+		return ''
+	return ''.join([cell.get_padded_text() for cell in line[:-1]]) + line[-1].text
+
+
+def _line_matches(original_line, line):
+	"""Check whether original_line is what _padded_line() would return for a line of sized cells, without building that text."""
+
+	pos = 0
+	last_cell_num = len(line) - 1
+	for cell_num, cell in enumerate(line):
+		if not original_line.startswith(cell.text, pos):
+			return False
+		pos += len(cell.text)
+		if cell_num < last_cell_num:
+			nof_spaces = cell.size - len(cell.text)
+			if original_line.count(' ', pos, pos + nof_spaces) != nof_spaces:
+				return False
+			pos += nof_spaces
+	return pos == len(original_line)
+
+
+def _render_window(table, start, stop, tab_width, multiples_of_tab_width=False):
+	"""Return the spaces aligned lines from start up to stop of a table, looking outside the window only as far as its column blocks extend."""
+
+	if not isinstance(tab_width, int):
+		raise TypeError("The fourth parameter of _render_window ('tab_width') should be an integer.")
+	if tab_width < 2:
+		raise ValueError("The fourth parameter of _render_window ('tab_width') should be 2 or greater.")
+
+	nof_lines = len(table)
+	start = max(start, 0)
+	stop = min(stop, nof_lines)
+	if start >= stop:
+		return []
+
+	window = [table[line_num] for line_num in range(start, stop)]
+	sizes = [[_min_cell_width(len(cell), tab_width, multiples_of_tab_width) for cell in row] for row in window]
+
+	for cell_num, start_range, stop_range in _column_blocks(window):
+		max_width = max([sizes[line_num][cell_num] for line_num in range(start_range, stop_range)])
+		# blocks which reach the edges of the window may continue beyond them
+		if start_range == 0:
+			line_num = start - 1
+			while line_num >= 0 and _cell_exists(table, line_num, cell_num + 1):
+				max_width = max(max_width, _min_cell_width(len(table[line_num][cell_num]), tab_width, multiples_of_tab_width))
+				line_num -= 1
+		if stop_range == len(window):
+			line_num = stop
+			while line_num < nof_lines and _cell_exists(table, line_num, cell_num + 1):
+				max_width = max(max_width, _min_cell_width(len(table[line_num][cell_num]), tab_width, multiples_of_tab_width))
+				line_num += 1
+		for line_num in range(start_range, stop_range):
+			sizes[line_num][cell_num] = max_width
+
+	new_lines = []
+	for row, row_sizes in zip(window, sizes):
+		parts = []
+		for cell_num in range(len(row) - 1):
+			parts.append(row[cell_num])
+			parts.append(' ' * (row_sizes[cell_num] - len(row[cell_num])))
+		if len(row) > 0:
+			parts.append(row[-1])
+		new_lines.append(''.join(parts))
+	return new_lines
+
+
+def _is_aligned_spaces(text, tab_width, multiples_of_tab_width=False):
+	"""Check whether text is already spaces aligned (ie. converting it to a table and back to spaces wouldn't change it).
+
+	Lines are tokenized a paragraph (a run of lines which aren't empty) at a time, as column blocks can't cross empty
+	lines. Each paragraph's cells are placed in columns like _table_from_spaces() does, without building rows, and
+	each column block is checked against the text as soon as its width is known, stopping at the first mismatch.
+	"""
+
+	if not isinstance(text, str):
+		raise TypeError("The first parameter of _is_aligned_spaces ('text') should be a string.")
+	if not isinstance(tab_width, int):
+		raise TypeError("The second parameter of _is_aligned_spaces ('tab_width') should be an integer.")
+	if tab_width < 2:
+		raise ValueError("The second parameter of _is_aligned_spaces ('tab_width') should be 2 or greater.")
+
+	paragraph = []
+	texts_lines = []
+	positions_lines = []
+	for line in _iter_lines(text):
+		texts, positions = _tokenize_line(line, tab_width)
+		if texts:
+			paragraph.append(line)
+			texts_lines.append(texts)
+			positions_lines.append(positions)
+			continue
+		# lines without cells convert to empty lines
+		if line or not _is_aligned_paragraph(paragraph, texts_lines, positions_lines, tab_width, multiples_of_tab_width):
+			return False
+		paragraph = []
+		texts_lines = []
+		positions_lines = []
+	return _is_aligned_paragraph(paragraph, texts_lines, positions_lines, tab_width, multiples_of_tab_width)
+
+
+def _is_aligned_paragraph(original_lines, texts_lines, positions_lines, tab_width, multiples_of_tab_width):
+	"""Check whether lines which all have cells are already spaces aligned, given their tokenized cell texts and positions."""
+
+	nof_lines = len(original_lines)
+	next_texts = [0] * nof_lines
+	pending_empties = [0] * nof_lines
+	# the position in each original line where the next cell should start
+	offsets = [0] * nof_lines
+	# rather than building rows, each line's cell in the current column is placed in a list of its own and popped once checked
+	column = [[] for _ in range(nof_lines)]
+	active = list(range(nof_lines))
+	cell_num = 0
+	while active:
+		next_active = []
+		for start_index, stop_index in _consecutive_runs(active):
+			block_line_nums = active[start_index:stop_index]
+			min_indent = _min_indent(block_line_nums, positions_lines, next_texts, pending_empties)
+			_place_cells(block_line_nums, min_indent, cell_num, tab_width, texts_lines, positions_lines, next_texts, pending_empties, column, next_active)
+
+		# lines which have another cell are in this column's blocks, and the others' cells must end their lines
+		for line_num in active:
+			if not (pending_empties[line_num] or next_texts[line_num] < len(texts_lines[line_num])) and original_lines[line_num][offsets[line_num]:] != column[line_num].pop():
+				return False
+
+		for start_index, stop_index in _consecutive_runs(next_active):
+			max_width = max([_min_cell_width(len(column[next_active[index]][0]), tab_width, multiples_of_tab_width) for index in range(start_index, stop_index)])
+			for index in range(start_index, stop_index):
+				line_num = next_active[index]
+				cell_text = column[line_num].pop()
+				original_line = original_lines[line_num]
+				offset = offsets[line_num]
+				if not original_line.startswith(cell_text, offset):
+					return False
+				offset += len(cell_text)
+				nof_spaces = max_width - len(cell_text)
+				if original_line.count(' ', offset, offset + nof_spaces) != nof_spaces:
+					return False
+				offsets[line_num] = offset + nof_spaces
+
+		active = next_active
+		cell_num += 1
+	return True
+
+
+def _is_canonical_elastic(text, tab_width=8, multiples_of_tab_width=False):
+	"""Check whether elastic tabstops aligned text is unchanged by converting it to spaces and back.
+
+	Stray whitespace (a cell starting or ending with a space or containing consecutive spaces, or a line ending with
+	a tab) is looked for first, as it's cheap to find and the round trip always changes it. Otherwise the round trip
+	is done, as it also changes empty cells which aren't needed for alignment (eg. in 'a\t\tb').
+	"""
+
+	if not isinstance(text, str):
+		raise TypeError("The first parameter of _is_canonical_elastic ('text') should be a string.")
+
+	for line in _iter_lines(text):
+		if line.endswith('\t') or '  ' in line:
+			return False
+		for cell in line.split('\t'):
+			if cell != cell.strip(' '):
+				return False
+	table = _from_elastic_tabstops(text)
+	return _table_from_spaces(_to_spaces(table, tab_width, multiples_of_tab_width), tab_width) == table
+
+
+def _to_spaces_diff(table, original_text, tab_width, multiples_of_tab_width=False, lengths=None):
+	"""Convert table to spaces aligned text, returning only the line ranges which differ from original_text as a list of LineChange named tuples.
+
+	Each LineChange replaces original lines start to stop (exclusive) with its lines, and they are in ascending order.
+	"""
+
+	if not _is_table(table):
+		raise TypeError("The first parameter of _to_spaces_diff ('table') should be a list.")
+	if not isinstance(original_text, str):
+		raise TypeError("The second parameter of _to_spaces_diff ('original_text') should be a string.")
+	if not isinstance(tab_width, int):
+		raise TypeError("The third parameter of _to_spaces_diff ('tab_width') should be an integer.")
+	if tab_width < 2:
+		raise ValueError("The third parameter of _to_spaces_diff ('tab_width') should be 2 or greater.")
+
+	lines = _sized_lines(table, tab_width, multiples_of_tab_width, lengths)
+	_set_block_sizes(lines)
+	original_lines = original_text.split('\n')
+	nof_original_lines = len(original_lines)
+
+	# each change is [start, stop, new lines, last changed line number]
+	changes = []
+	for line_num, line in enumerate(lines):
+		if line_num < nof_original_lines and _line_matches(original_lines[line_num], line):
+			continue
+		if changes and changes[-1][3] == line_num - 1:
+			change = changes[-1]
+		else:
+			change = [min(line_num, nof_original_lines), None, [], None]
+			changes.append(change)
+		change[1] = min(line_num + 1, nof_original_lines)
+		change[2].append(_padded_line(line))
+		change[3] = line_num
+
+	# original lines beyond the end of the table are deleted
+	if nof_original_lines > len(lines):
+		if changes and changes[-1][3] == len(lines) - 1:
+			changes[-1][1] = nof_original_lines
+		else:
+			changes.append([len(lines), nof_original_lines, [], None])
+
+	return [LineChange(start, stop, new_lines) for start, stop, new_lines, _ in changes]
+
+
+def _block_widths(rows, tab_width, multiples_of_tab_width=False):
+	"""Return an array of the widths of all column blocks in rows, in the order in which the blocks start.
+
+	This is the first pass of a two-pass conversion to spaces. Only the widths of the blocks are kept, so
+	rows can be any iterable (such as a generator reading lines from a file) and memory use is proportional
+	to the number of blocks rather than the number of cells.
+	"""
+
+	widths = array('l')
+	# the block numbers of the blocks which are still open, indexed by column (blocks are nested, so this is always a prefix)
+	open_blocks = []
+	for row in rows:
+		nof_terminated = max(len(row) - 1, 0)
+		for cell_num in range(nof_terminated):
+			size = _min_cell_width(len(row[cell_num]), tab_width, multiples_of_tab_width)
+			if cell_num < len(open_blocks):
+				block_num = open_blocks[cell_num]
+				if size > widths[block_num]:
+					widths[block_num] = size
+			else:
+				open_blocks.append(len(widths))
+				widths.append(size)
+		# cells which aren't terminated end their column blocks
+		del open_blocks[nof_terminated:]
+	return widths
+
+
+def _iter_padded_lines(rows, widths):
+	"""Yield a spaces aligned line for each row, using block widths found by _block_widths() for the same rows.
+
+	This is the second pass of a two-pass conversion to spaces.
+	"""
+
+	open_blocks = []
+	next_block_num = 0
+	for row in rows:
+		nof_terminated = max(len(row) - 1, 0)
+		parts = []
+		for cell_num in range(nof_terminated):
+			if cell_num >= len(open_blocks):
+				open_blocks.append(next_block_num)
+				next_block_num += 1
+			text = row[cell_num]
+			parts.append(text)
+			parts.append(' ' * (widths[open_blocks[cell_num]] - len(text)))
+		del open_blocks[nof_terminated:]
+		if len(row) > 0:
+			parts.append(row[-1])
+		yield ''.join(parts)
+
+
+def _format_row(values, fmts):
+	"""Return a list of strings for a row of values, formatted with the %-style format for each column (or str() where it's None)."""
+
+	if fmts is None:
+		return ['' if value is None else value if isinstance(value, str) else str(value) for value in values]
+	return ['' if value is None else str(value) if fmt is None else fmt % value for fmt, value in zip(fmts, values)]
+
+
+def _is_ndarray(values):
+	"""Check whether values is a NumPy array (NumPy is optional, and only imported by whoever made the array)."""
+
+	numpy = sys.modules.get('numpy')
+	return numpy is not None and isinstance(values, numpy.ndarray)
+
+
+def _format_array(values, fmt):
+	"""Return a list of lists of strings and a list of lists of their lengths for a 2D NumPy array, formatting whole columns at once."""
+
+	import numpy
+	if fmt is None:
+		strings = values.astype(str)
+	elif isinstance(fmt, str):
+		strings = numpy.char.mod(fmt, values)
+	else:
+		strings = numpy.stack([values[:, col_num].astype(str) if col_fmt is None else numpy.char.mod(col_fmt, values[:, col_num]) for col_num, col_fmt in enumerate(fmt)], axis=1)
+	return strings.tolist(), numpy.char.str_len(strings).tolist()
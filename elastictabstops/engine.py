@@ -0,0 +1,220 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""
+Choice of the engine which runs a conversion, for conversions passed engine='auto'.
+
+The input's shape is estimated cheaply (its length and line count, and a sample of its rows or lines), and the
+engine whose estimated time is lowest is chosen. Each engine's time is modelled as a fixed cost per call plus a
+cost per cell (or line), using the costs in a profile written by:
+
+	python -m elastictabstops calibrate
+
+The profile is read from the path in the ELASTICTABSTOPS_PROFILE environment variable, or DEFAULT_PROFILE_PATH,
+and DEFAULT_PROFILE is used if there isn't one. Each choice is logged at DEBUG level to the 'elastictabstops'
+logger, along with the estimated shape and costs.
+"""
+
+from collections import namedtuple
+import json
+import logging
+import os
+import random
+
+logger = logging.getLogger('elastictabstops')
+
+PROFILE_VERSION = 1
+PROFILE_ENV_VAR = 'ELASTICTABSTOPS_PROFILE'
+DEFAULT_PROFILE_PATH = os.path.join(os.path.expanduser('~'), '.elastictabstops-profile.json')
+
+# the engines of each kind of conversion (from_fixed_tabstops is the from_spaces kind and to_fixed_tabstops the to_spaces kind):
+#  * 'serial' is the usual conversion
+#  * 'single_pass' finds every cell's column block in one pass, like classes.TableFormatter
+#  * 'parallel' sizes the column blocks in worker processes (see parallel.py)
+#  * 'streaming' reads the rows twice rather than holding them in memory (and is the only engine for rows read lazily)
+#  * 'cached' tokenizes each distinct line once, using a new convert.TokenCache
+ENGINES = {
+	'from_spaces': ('serial', 'cached'),
+	'from_elastic_tabstops': ('serial',),
+	'to_spaces': ('serial', 'single_pass', 'parallel', 'streaming'),
+	'to_elastic_tabstops': ('serial',),
+}
+
+# seconds per call and per cell (or line) of each engine, which calibrate() measures for this machine. 'cached' also
+# has a cost per repeated line. Engines without costs are never chosen automatically, so without a calibrated
+# profile to_spaces stays serial and from_spaces only uses the cache for text with many repeated lines
+DEFAULT_PROFILE = {
+	'version': PROFILE_VERSION,
+	'from_spaces': {'serial': [1e-5, 1e-5], 'cached': [1e-5, 1.2e-5, 1e-6]},
+	'to_spaces': {'serial': [1e-5, 2.5e-6], 'single_pass': None, 'parallel': None, 'streaming': None},
+}
+
+# the number of rows or lines looked at to estimate the shape of the input
+SAMPLE_SIZE = 32
+
+TableShape = namedtuple('TableShape', ['nrows', 'ncells', 'ncolumns'])
+TextShape = namedtuple('TextShape', ['nbytes', 'nlines', 'repeated_fraction'])
+
+# profiles by path, loaded on first use (a race just loads a profile twice)
+_profiles = {}
+
+
+def table_shape(rows):
+	"""Return the TableShape of a list of rows, estimating the number of cells and columns from a sample of rows."""
+
+	nrows = len(rows)
+	if nrows == 0:
+		return TableShape(0, 0, 0)
+	sample = [len(rows[line_num]) for line_num in range(0, nrows, max(nrows // SAMPLE_SIZE, 1))]
+	return TableShape(nrows, nrows * sum(sample) // len(sample), max(sample))
+
+
+def text_shape(text):
+	"""Return the TextShape of text, estimating the fraction of its lines which are repeats from the lines at evenly spaced offsets."""
+
+	sample = {}
+	for offset in range(0, len(text), max(len(text) // SAMPLE_SIZE, 1)):
+		start = text.rfind('\n', 0, offset) + 1
+		if start not in sample:
+			stop = text.find('\n', offset)
+			sample[start] = text[start:] if stop == -1 else text[start:stop]
+	repeated_fraction = 1.0 - float(len(set(sample.values()))) / len(sample) if sample else 0.0
+	return TextShape(len(text), text.count('\n') + 1, repeated_fraction)
+
+
+def load_profile(path=None):
+	"""Return the profile at path (by default the one in the ELASTICTABSTOPS_PROFILE environment variable, or DEFAULT_PROFILE_PATH), or DEFAULT_PROFILE if it can't be read."""
+
+	path = path or os.environ.get(PROFILE_ENV_VAR) or DEFAULT_PROFILE_PATH
+	profile = _profiles.get(path)
+	if profile is None:
+		try:
+			with open(path) as fp:
+				profile = json.load(fp)
+			if not isinstance(profile, dict) or profile.get('version') != PROFILE_VERSION:
+				raise ValueError("not a version %d profile" % PROFILE_VERSION)
+		except IOError:
+			profile = DEFAULT_PROFILE
+		except ValueError as err:
+			logger.warning('Ignoring the engine profile %s (%s), run: python -m elastictabstops calibrate', path, err)
+			profile = DEFAULT_PROFILE
+		_profiles[path] = profile
+	return profile
+
+
+def _parallel_available(shape):
+	from elastictabstops.parallel import shared_memory
+	return shared_memory is not None and (os.cpu_count() or 1) > 1 and shape.ncolumns > 1
+
+
+def estimated_costs(kind, shape, profile=None):
+	"""Return a dict of the estimated seconds each engine with costs in the profile would take to convert input of the given shape."""
+
+	costs = (profile or load_profile()).get(kind) or {}
+	estimates = {}
+	for engine, engine_costs in costs.items():
+		if not engine_costs or engine not in ENGINES[kind]:
+			continue
+		if kind == 'to_spaces':
+			if engine == 'parallel' and not _parallel_available(shape):
+				continue
+			estimates[engine] = engine_costs[0] + engine_costs[1] * shape.ncells
+		elif engine == 'cached':
+			nof_repeats = shape.nlines * shape.repeated_fraction
+			estimates[engine] = engine_costs[0] + engine_costs[1] * (shape.nlines - nof_repeats) + engine_costs[2] * nof_repeats
+		else:
+			estimates[engine] = engine_costs[0] + engine_costs[1] * shape.nlines
+	return estimates
+
+
+def select_engine(kind, engine, data, profile=None):
+	"""Return the engine to convert data (text or rows) with, which is engine unless that's 'auto', logging the choice.
+
+	kind is one of ENGINES' keys.
+	"""
+
+	if engine != 'auto' and engine not in ENGINES[kind]:
+		raise ValueError("The engine parameter should be 'auto' or one of %s." % ', '.join(ENGINES[kind]))
+
+	# data which isn't a list (eg. stream.MappedElasticRows, or None for a file streamed by stream.elastic_tabstops_to_spaces()) is read lazily
+	if kind == 'to_spaces' and not isinstance(data, list):
+		if engine not in ('auto', 'streaming'):
+			raise ValueError("Rows which are read lazily can only be converted by the 'streaming' engine.")
+		logger.debug('%s: streaming engine (rows are read lazily)', kind)
+		return 'streaming'
+	if engine != 'auto':
+		logger.debug('%s: %s engine (requested)', kind, engine)
+		return engine
+	if len(ENGINES[kind]) == 1:
+		logger.debug('%s: %s engine (auto, the only engine)', kind, ENGINES[kind][0])
+		return ENGINES[kind][0]
+
+	shape = table_shape(data) if kind == 'to_spaces' else text_shape(data)
+	estimates = estimated_costs(kind, shape, profile)
+	chosen = min(estimates, key=estimates.get) if estimates else 'serial'
+	logger.debug('%s: %s engine (auto, %s, estimated seconds %s)', kind, chosen, shape, ', '.join(['%s=%.3g' % item for item in sorted(estimates.items())]))
+	return chosen
+
+
+def _fit(small_size, small_time, large_size, large_time):
+	"""Return [cost per call, cost per item] of the line through two timings."""
+
+	per_item = max((large_time - small_time) / (large_size - small_size), 0.0)
+	return [max(small_time - per_item * small_size, 0.0), per_item]
+
+
+def _random_rows(rng, nrows, ncolumns):
+	return [[rng.choice(['x', 'abc', 'longer word', '', '12345678901']) for _ in range(ncolumns)] for _ in range(nrows)]
+
+
+def calibrate(large_cells=20000, min_time=0.01):
+	"""Time each engine on small and large generated input and return a profile of their costs on this machine.
+
+	The parallel engine is only timed if there's more than one CPU.
+	"""
+
+	from elastictabstops.convert import _from_spaces, _to_spaces
+	from elastictabstops.fuzz import measure
+
+	rng = random.Random(0)
+	ncolumns = 50
+	small_rows = _random_rows(rng, 10, 5)
+	# the large table has more lines than the small one as well as more cells, so both fits have two points
+	large_rows = _random_rows(rng, max(large_cells // ncolumns, 2 * len(small_rows)), ncolumns)
+	small_cells = sum([len(row) for row in small_rows])
+	large_cells = sum([len(row) for row in large_rows])
+
+	to_spaces_costs = dict([(engine, None) for engine in ENGINES['to_spaces']])
+	for engine in ENGINES['to_spaces']:
+		if engine == 'parallel' and not _parallel_available(table_shape(large_rows)):
+			continue
+		convert = lambda rows, engine=engine: _to_spaces(rows, 8, engine=engine)
+		to_spaces_costs[engine] = _fit(small_cells, measure(convert, small_rows, min_time=min_time), large_cells, measure(convert, large_rows, min_time=min_time))
+
+	small_text = _to_spaces(small_rows, 8)
+	distinct_text = _to_spaces(large_rows, 8)
+	repeated_text = '\n'.join([distinct_text.partition('\n')[0]] * len(large_rows))
+	from_spaces_costs = {}
+	for engine in ENGINES['from_spaces']:
+		convert = lambda text, engine=engine: _from_spaces(text, 8, engine=engine)
+		from_spaces_costs[engine] = _fit(len(small_rows), measure(convert, small_text, min_time=min_time), len(large_rows), measure(convert, distinct_text, min_time=min_time))
+	per_call, _ = from_spaces_costs['cached']
+	from_spaces_costs['cached'].append(max((measure(lambda text: _from_spaces(text, 8, engine='cached'), repeated_text, min_time=min_time) - per_call) / len(large_rows), 0.0))
+
+	return {'version': PROFILE_VERSION, 'from_spaces': from_spaces_costs, 'to_spaces': to_spaces_costs}
+
+
+def save_profile(profile, path=None):
+	"""Write a profile to path (by default the one load_profile() would read), returning the path."""
+
+	path = path or os.environ.get(PROFILE_ENV_VAR) or DEFAULT_PROFILE_PATH
+	with open(path, 'w') as fp:
+		json.dump(profile, fp, indent='\t', sort_keys=True)
+		fp.write('\n')
+	_profiles[path] = profile
+	return path
@@ -0,0 +1,189 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""
+Generators of pathological input, and a harness which checks that every conversion's run time grows no faster than
+about n log n with the size of its input. Run as: python -m elastictabstops.fuzz
+
+The harness times conversions by default, or counts the lines of this package's code they run (with count_steps),
+which doesn't depend on how busy the machine is.
+"""
+
+import math
+import os
+import random
+import sys
+import time
+
+from elastictabstops.classes import Text
+
+TAB_WIDTH = 4
+
+
+def _repeat_to_size(unit, size):
+	return unit * max(size // len(unit), 1)
+
+
+def many_cells_spaces(size):
+	"""One line of thousands of cells separated by two spaces."""
+	return _repeat_to_size('ab  ', size)
+
+
+def many_cells_tabs(size):
+	"""One line of thousands of tab separated cells."""
+	return _repeat_to_size('ab\t', size)
+
+
+def staircase_spaces(size):
+	"""Lines indented one more tab width of spaces than the line before."""
+	lines = []
+	total = 0
+	while total < size:
+		lines.append(' ' * (TAB_WIDTH * len(lines)) + 'x')
+		total += len(lines[-1]) + 1
+	return '\n'.join(lines)
+
+
+def staircase_tabs(size):
+	"""Lines indented one more tab than the line before."""
+	lines = []
+	total = 0
+	while total < size:
+		lines.append('\t' * len(lines) + 'x')
+		total += len(lines[-1]) + 1
+	return '\n'.join(lines)
+
+
+def staircase_cells_spaces(size):
+	"""Lines of cells where each cell starts further right than the one above it, so every line needs empty cells inserting."""
+	lines = []
+	total = 0
+	while total < size:
+		lines.append('  '.join(['x' * (len(lines) % 7 + 1)] * 16))
+		total += len(lines[-1]) + 1
+	return '\n'.join(lines)
+
+
+def wide_line_among_short_spaces(size):
+	"""Many short lines and one very wide one."""
+	return '\n'.join(['a  b'] * (size // 10) + [many_cells_spaces(size // 2)])
+
+
+def wide_line_among_short_tabs(size):
+	"""Many short lines and one very wide one."""
+	return '\n'.join(['a\tb'] * (size // 8) + [many_cells_tabs(size // 2)])
+
+
+def long_line(size):
+	"""One very long line of a single cell."""
+	return _repeat_to_size('abc def ', size)
+
+
+def random_text(size, seed=0):
+	"""Random words separated by runs of spaces and tabs."""
+	rng = random.Random(seed)
+	parts = []
+	total = 0
+	while total < size:
+		parts.append(rng.choice(['x', 'abc', 'longer word', ' ', '  ', '    ', '\t', '\t\t', '\n', '\n\t']))
+		total += len(parts[-1])
+	return ''.join(parts)
+
+
+SPACES_GENERATORS = [many_cells_spaces, staircase_spaces, staircase_cells_spaces, wide_line_among_short_spaces, long_line, random_text]
+TABS_GENERATORS = [many_cells_tabs, staircase_tabs, wide_line_among_short_tabs, long_line, random_text]
+
+# name: (generators, function preparing the input from generated text, conversion)
+CONVERSIONS = {
+	'from_spaces': (SPACES_GENERATORS, Text, lambda text: text.from_spaces(TAB_WIDTH)),
+	'from_fixed_tabstops': (SPACES_GENERATORS + TABS_GENERATORS, Text, lambda text: text.from_fixed_tabstops(TAB_WIDTH)),
+	'from_elastic_tabstops': (TABS_GENERATORS, Text, lambda text: text.from_elastic_tabstops()),
+	'to_spaces': (TABS_GENERATORS, lambda text: Text(text).from_elastic_tabstops(), lambda table: table.to_spaces(TAB_WIDTH)),
+	'to_fixed_tabstops': (TABS_GENERATORS, lambda text: Text(text).from_elastic_tabstops(), lambda table: table.to_fixed_tabstops(TAB_WIDTH)),
+	'to_elastic_tabstops': (TABS_GENERATORS, lambda text: Text(text).from_elastic_tabstops(), lambda table: table.to_elastic_tabstops()),
+}
+
+
+def measure(convert, prepared_input, repeats=3, min_time=0.01):
+	"""Return the fastest of several timings of a conversion, where each timing is the mean over enough calls to take at least min_time seconds."""
+
+	best = None
+	for _ in range(repeats):
+		nof_calls = 0
+		start = time.perf_counter()
+		while True:
+			convert(prepared_input)
+			nof_calls += 1
+			elapsed = time.perf_counter() - start
+			if elapsed >= min_time:
+				break
+		elapsed /= nof_calls
+		best = elapsed if best is None else min(best, elapsed)
+	return best
+
+
+def count_steps(convert, prepared_input):
+	"""Return the number of lines of this package's code run by a conversion, a deterministic measure of its work.
+
+	Work done inside builtins (eg. str.join) isn't counted, so this only finds growth in the package's own loops.
+	"""
+
+	package_dir = os.path.dirname(os.path.abspath(__file__))
+	nof_steps = [0]
+
+	def trace_lines(frame, event, arg):
+		if event == 'line':
+			nof_steps[0] += 1
+		return trace_lines
+
+	def trace_calls(frame, event, arg):
+		if os.path.dirname(os.path.abspath(frame.f_code.co_filename)) == package_dir:
+			return trace_lines
+		return None
+
+	old_trace = sys.gettrace()
+	sys.settrace(trace_calls)
+	try:
+		convert(prepared_input)
+	finally:
+		sys.settrace(old_trace)
+	return nof_steps[0]
+
+
+def growth_exponent(measurements):
+	"""Return the slope of the least squares fit of log(time) against log(size) for a list of (size, time) measurements.
+
+	Linear growth gives about 1, n log n a little more (about 1.1 for the sizes used here) and quadratic growth about 2.
+	"""
+
+	points = [(math.log(size), math.log(max(elapsed, 1e-9))) for size, elapsed in measurements]
+	mean_x = sum([x for x, _ in points]) / len(points)
+	mean_y = sum([y for _, y in points]) / len(points)
+	return sum([(x - mean_x) * (y - mean_y) for x, y in points]) / sum([(x - mean_x) ** 2 for x, _ in points])
+
+
+def check_scaling(sizes=(10000, 20000, 40000, 80000), max_exponent=1.35, conversions=None, cost=measure):
+	"""Find the cost (by default the time) of every conversion on every generator's input at each size, and return a list of (conversion, generator, exponent) for those which grow too fast.
+
+	cost is called with a conversion and its prepared input, like measure() and count_steps().
+	"""
+
+	failures = []
+	for name in sorted(conversions or CONVERSIONS):
+		generators, prepare, convert = CONVERSIONS[name]
+		for generator in generators:
+			measurements = [(size, cost(convert, prepare(generator(size)))) for size in sizes]
+			exponent = growth_exponent(measurements)
+			if exponent > max_exponent:
+				failures.append((name, generator.__name__, exponent))
+	return failures
+
+
+if __name__ == '__main__':
+	for failure in check_scaling(sizes=(20000, 40000, 80000, 160000, 320000)):
+		print('%s grows too fast on %s input (exponent %.2f)' % failure)
@@ -0,0 +1,143 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""
+A git long-running filter process, which converts elastic tabstops in the working tree to spaces in the repository.
+
+Configure it with:
+
+	git config filter.elastictabstops.process "python -m elastictabstops git-filter --tab-width 4"
+	echo '*.c filter=elastictabstops' >> .gitattributes
+
+Git starts one process and sends it every file it checks out or adds, rather than starting a process per file.
+The protocol is described in git's gitattributes(5) documentation: messages are made of pkt-lines (a 4 digit
+hex length which includes itself, followed by that many bytes less 4) ending with a flush packet ('0000').
+"clean" converts elastic tabstops to spaces and "smudge" converts spaces to elastic tabstops. Files which
+aren't UTF-8 are passed through unchanged.
+"""
+
+import sys
+
+from elastictabstops.operations import convert_text
+
+MAX_PACKET_DATA = 65516
+FLUSH = b'0000'
+
+COMMANDS = {
+	'clean': 'elastic_tabstops_to_spaces',
+	'smudge': 'spaces_to_elastic_tabstops',
+}
+
+
+def _read_packet(fp):
+	"""Read a pkt-line from fp, returning its data, None for a flush packet, or raising EOFError if the stream has ended."""
+
+	header = fp.read(4)
+	if len(header) < 4:
+		raise EOFError("The git filter stream ended unexpectedly.")
+	length = int(header, 16)
+	if length == 0:
+		return None
+	data = fp.read(length - 4)
+	if len(data) < length - 4:
+		raise EOFError("The git filter stream ended unexpectedly.")
+	return data
+
+
+def _read_text_packets(fp):
+	"""Read text pkt-lines up to a flush packet, returning them as a list of strings without their newlines."""
+
+	lines = []
+	while True:
+		data = _read_packet(fp)
+		if data is None:
+			return lines
+		lines.append(data.decode('utf-8').rstrip('\n'))
+
+
+def _read_content(fp):
+	"""Read binary pkt-lines up to a flush packet, returning their data joined together."""
+
+	chunks = []
+	while True:
+		data = _read_packet(fp)
+		if data is None:
+			return b''.join(chunks)
+		chunks.append(data)
+
+
+def _write_packet(fp, data):
+	fp.write(b'%04x' % (len(data) + 4))
+	fp.write(data)
+
+
+def _write_text_packets(fp, lines):
+	"""Write text pkt-lines followed by a flush packet."""
+
+	for line in lines:
+		_write_packet(fp, line.encode('utf-8') + b'\n')
+	fp.write(FLUSH)
+
+
+def _write_content(fp, content):
+	"""Write content split into pkt-lines of at most MAX_PACKET_DATA bytes, followed by a flush packet."""
+
+	view = memoryview(content)
+	for start in range(0, len(content), MAX_PACKET_DATA):
+		_write_packet(fp, view[start:start + MAX_PACKET_DATA])
+	fp.write(FLUSH)
+
+
+def _handshake(rfile, wfile):
+	"""Agree on the protocol version and capabilities with git."""
+
+	welcome = _read_text_packets(rfile)
+	if not welcome or welcome[0] != 'git-filter-client' or 'version=2' not in welcome[1:]:
+		raise ValueError("Expected a git filter client supporting version 2 of the protocol, got %r." % welcome)
+	_write_text_packets(wfile, ['git-filter-server', 'version=2'])
+
+	capabilities = _read_text_packets(rfile)
+	_write_text_packets(wfile, [capability for capability in ('capability=clean', 'capability=smudge') if capability in capabilities])
+	wfile.flush()
+
+
+def _convert_content(command, content, tab_width, multiples_of_tab_width):
+	try:
+		text = content.decode('utf-8')
+	except UnicodeDecodeError:
+		return content
+	return convert_text(text, COMMANDS[command], tab_width, multiples_of_tab_width).encode('utf-8')
+
+
+def run_filter(rfile, wfile, tab_width=8, multiples_of_tab_width=False):
+	"""Run the filter process protocol over binary streams until git closes rfile."""
+
+	_handshake(rfile, wfile)
+	while True:
+		try:
+			headers = _read_text_packets(rfile)
+		except EOFError:
+			return
+		keys = dict([header.split('=', 1) for header in headers if '=' in header])
+		content = _read_content(rfile)
+
+		command = keys.get('command')
+		try:
+			if command not in COMMANDS:
+				raise ValueError("Unknown git filter command %r." % command)
+			result = _convert_content(command, content, tab_width, multiples_of_tab_width)
+		except (ValueError, TypeError) as err:
+			sys.stderr.write('elastictabstops: %s: %s\n' % (keys.get('pathname', ''), err))
+			_write_text_packets(wfile, ['status=error'])
+		else:
+			_write_text_packets(wfile, ['status=success'])
+			_write_content(wfile, result)
+			# an empty list keeps the status as success
+			_write_text_packets(wfile, [])
+		wfile.flush()
+
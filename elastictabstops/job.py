@@ -0,0 +1,122 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""Conversions which can be run a little at a time and cancelled, so that editors can interleave them with their event loops."""
+
+import time
+
+from elastictabstops.convert import _table_from_spaces_steps, _from_elastic_tabstops_steps, _to_spaces_steps, _spaces_to_tabs_steps, _to_elastic_tabstops_steps
+from elastictabstops.operations import split_operation
+
+# each format's phases are functions taking the output of the previous phase (or the text), the tab width and
+# multiples_of_tab_width, and returning a generator which yields (work done, total work) and returns its output
+_FROM_PHASES = {
+	'spaces': [lambda text, tab_width, multiples_of_tab_width: _table_from_spaces_steps(text, tab_width)],
+	'elastic_tabstops': [lambda text, tab_width, multiples_of_tab_width: _from_elastic_tabstops_steps(text)],
+	'fixed_tabstops': [lambda text, tab_width, multiples_of_tab_width: _table_from_spaces_steps(text, tab_width, expand_tabs=True)],
+}
+
+_TO_PHASES = {
+	'spaces': [lambda table, tab_width, multiples_of_tab_width: _to_spaces_steps(table, tab_width, multiples_of_tab_width)],
+	'elastic_tabstops': [lambda table, tab_width, multiples_of_tab_width: _to_elastic_tabstops_steps(table)],
+	'fixed_tabstops': [
+		lambda table, tab_width, multiples_of_tab_width: _to_spaces_steps(table, tab_width, True),
+		lambda spaced_text, tab_width, multiples_of_tab_width: _spaces_to_tabs_steps(spaced_text, tab_width),
+	],
+}
+
+
+def _fraction_steps(phases, value, tab_width, multiples_of_tab_width):
+	"""Generator which runs each phase on the output of the one before, yielding the fraction of the work done so far and returning the last output."""
+
+	for phase_num, phase in enumerate(phases):
+		steps = phase(value, tab_width, multiples_of_tab_width)
+		while True:
+			try:
+				done, total = next(steps)
+			except StopIteration as stop:
+				value = stop.value
+				break
+			yield (phase_num + min(float(done) / total, 1.0)) / len(phases)
+	return value
+
+
+class ConversionJob(object):
+	"""A conversion of text using a named operation (one of operations.OPERATIONS) which is done in small steps by calling run().
+
+	The result is the same as operations.convert_text() would return. For example, to convert without blocking a Tkinter UI:
+
+		job = ConversionJob(text, 'spaces_to_elastic_tabstops', tab_width=4, on_progress=progress_bar.set)
+
+		def convert_some():
+			if not job.run(max_time=0.01):
+				root.after(0, convert_some)
+			elif not job.cancelled:
+				show(job.result)
+	"""
+
+	__slots__ = ['op', 'progress', 'result', 'cancelled', '_steps', '_on_progress']
+
+	def __init__(self, text, op, tab_width=8, multiples_of_tab_width=False, on_progress=None):
+		if not isinstance(text, str):
+			raise TypeError("The first parameter of ConversionJob ('text') should be a string.")
+		from_format, to_format = split_operation(op)
+		if not isinstance(tab_width, int):
+			raise TypeError("The third parameter of ConversionJob ('tab_width') should be an integer.")
+		if tab_width < 2:
+			raise ValueError("The third parameter of ConversionJob ('tab_width') should be 2 or greater.")
+
+		self.op = op
+		# the fraction of the work done, from 0.0 to 1.0
+		self.progress = 0.0
+		self.result = None
+		self.cancelled = False
+		self._steps = _fraction_steps(_FROM_PHASES[from_format] + _TO_PHASES[to_format], text, tab_width, multiples_of_tab_width)
+		self._on_progress = on_progress
+
+	@property
+	def done(self):
+		"""Whether the job has finished or been cancelled."""
+		return self.result is not None or self.cancelled
+
+	def run(self, max_steps=None, max_time=None):
+		"""Do some of the conversion and return whether the job is done.
+
+		Work stops after max_steps steps (a step is a line, a few dozen lines or cells, or a column block) or once max_time seconds have passed,
+		whichever comes first, or if the job is cancelled (which can be done from on_progress or another thread).
+		With neither limit the job runs to the end. on_progress is called with the progress before returning.
+		"""
+
+		if self.done:
+			return True
+		deadline = None if max_time is None else time.perf_counter() + max_time
+		nof_steps = 0
+		try:
+			while not self.cancelled:
+				# estimates of the total work can go up as it's done, but progress shouldn't go backwards
+				self.progress = max(self.progress, next(self._steps))
+				nof_steps += 1
+				if max_steps is not None and nof_steps >= max_steps:
+					break
+				if deadline is not None and time.perf_counter() >= deadline:
+					break
+		except StopIteration as stop:
+			self.result = stop.value
+			self.progress = 1.0
+			self._steps = None
+
+		if self.cancelled and self._steps is not None:
+			self._steps.close()
+			self._steps = None
+		if self._on_progress is not None:
+			self._on_progress(self.progress)
+		return self.done
+
+	def cancel(self):
+		"""Stop the job at the end of its current step. Its result stays None."""
+		self.cancelled = True
@@ -0,0 +1,132 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""
+Summaries of the column block layout of chunks of rows, so that a table split into chunks can be aligned in parallel.
+
+Column blocks can span the boundaries between chunks, so each chunk's summary records the blocks which are open
+at its top (head) and bottom (tail). Summaries of adjacent chunks merge associatively, so they can be reduced in
+any grouping. A chunk is then rendered with the merged summaries of everything before and after it:
+
+	summaries = [summarize(chunk) for chunk in chunks]                  # in parallel
+	contexts = surrounding_summaries(summaries)
+	texts = [render_chunk(chunk, before, after, 4) for chunk, (before, after) in zip(chunks, contexts)]   # in parallel
+	spaces_text = '\\n'.join(texts)
+
+Summaries store the lengths of the longest cells rather than widths, so they don't depend on the tab width.
+"""
+
+from collections import namedtuple
+
+from elastictabstops.convert import _column_blocks, _min_cell_width, _padded_line, _set_block_sizes, _sized_lines
+
+
+class LayoutSummary(namedtuple('LayoutSummary', ['nrows', 'head', 'tail', 'spanning', 'closed'])):
+	"""The column block layout of a chunk of rows.
+
+	head and tail are tuples holding, for each column with a block open at the first (or last) row, the length
+	of the longest cell in that block. The first spanning columns' blocks cover every row, so they are both
+	head and tail blocks. closed is the number of blocks which touch neither the first nor the last row.
+	"""
+
+	__slots__ = ()
+
+	def merge(self, other):
+		"""Return the summary of this chunk's rows followed by other's."""
+
+		if self.nrows == 0:
+			return other
+		if other.nrows == 0:
+			return self
+
+		head = list(self.head)
+		for cell_num in range(min(self.spanning, len(other.head))):
+			head[cell_num] = max(head[cell_num], other.head[cell_num])
+		tail = list(other.tail)
+		for cell_num in range(min(other.spanning, len(self.tail))):
+			tail[cell_num] = max(tail[cell_num], self.tail[cell_num])
+
+		# the blocks open at the boundary (joined or not) become closed, except those which reach the top or bottom
+		# by spanning self or other, which are the first max(self.spanning, other.spanning) columns
+		closed = self.closed + other.closed + max(len(self.tail), len(other.head)) - max(self.spanning, other.spanning)
+		return LayoutSummary(self.nrows + other.nrows, tuple(head), tuple(tail), min(self.spanning, other.spanning), closed)
+
+
+EMPTY_SUMMARY = LayoutSummary(0, (), (), 0, 0)
+
+
+def summarize(rows):
+	"""Return the LayoutSummary of a chunk of rows (lists of cell texts)."""
+
+	nrows = len(rows)
+	if nrows == 0:
+		return EMPTY_SUMMARY
+	head = [0] * max(len(rows[0]) - 1, 0)
+	tail = [0] * max(len(rows[-1]) - 1, 0)
+	spanning = 0
+	closed = 0
+	for cell_num, start_range, stop_range in _column_blocks(rows):
+		max_length = max([len(rows[line_num][cell_num]) for line_num in range(start_range, stop_range)])
+		if start_range == 0:
+			head[cell_num] = max_length
+		if stop_range == nrows:
+			tail[cell_num] = max_length
+		if start_range == 0 and stop_range == nrows:
+			spanning += 1
+		elif start_range != 0 and stop_range != nrows:
+			closed += 1
+	return LayoutSummary(nrows, tuple(head), tuple(tail), spanning, closed)
+
+
+def surrounding_summaries(summaries):
+	"""Return a list of (before, after) pairs for a list of chunks' summaries, where before is the merged summary of all the chunks before each one and after of all the chunks after it."""
+
+	befores = [EMPTY_SUMMARY]
+	for summary in summaries[:-1]:
+		befores.append(befores[-1].merge(summary))
+	afters = [EMPTY_SUMMARY]
+	for summary in reversed(summaries[1:]):
+		afters.append(summary.merge(afters[-1]))
+	return list(zip(befores, reversed(afters)))
+
+
+def render_chunk(rows, before=None, after=None, tab_width=8, multiples_of_tab_width=False):
+	"""Return a chunk of rows as spaces aligned text, given the merged summaries of the rows before and after it.
+
+	The chunks' texts joined with newlines are the same as converting all the rows at once with Table.to_spaces().
+	"""
+
+	before = before or EMPTY_SUMMARY
+	after = after or EMPTY_SUMMARY
+	lines = _sized_lines(rows, tab_width, multiples_of_tab_width)
+	_set_block_sizes(lines)
+	if not lines:
+		return ''
+
+	# widen the blocks open at the top and bottom of the chunk to fit the longest cells of the blocks they continue
+	nrows = len(lines)
+	# empty rows have no cells at all
+	nof_spanning = max(min([len(line) - 1 for line in lines]), 0)
+	for cell_num in range(len(lines[0]) - 1):
+		outside_lengths = [before.tail[cell_num]] if cell_num < len(before.tail) else []
+		if cell_num < nof_spanning and cell_num < len(after.head):
+			outside_lengths.append(after.head[cell_num])
+		if outside_lengths:
+			_widen_block(lines, range(nrows), cell_num, _min_cell_width(max(outside_lengths), tab_width, multiples_of_tab_width))
+	for cell_num in range(nof_spanning, min(len(lines[-1]) - 1, len(after.head))):
+		_widen_block(lines, range(nrows - 1, -1, -1), cell_num, _min_cell_width(after.head[cell_num], tab_width, multiples_of_tab_width))
+	return '\n'.join([_padded_line(line) for line in lines])
+
+
+def _widen_block(lines, line_nums, cell_num, width):
+	"""Make the cells of the block starting at the first of line_nums (and continuing through them in order) at least width wide."""
+
+	for line_num in line_nums:
+		if len(lines[line_num]) <= cell_num + 1:
+			return
+		lines[line_num][cell_num].size = max(lines[line_num][cell_num].size, width)
@@ -0,0 +1,100 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""Conversions between text formats referred to by name, for use by the command line and other front ends."""
+
+import concurrent.futures
+import itertools
+import os
+import sys
+
+from elastictabstops.classes import Text, Table
+
+FORMATS = ('spaces', 'elastic_tabstops', 'fixed_tabstops')
+
+# names of the form '<from format>_to_<to format>', eg. 'spaces_to_elastic_tabstops'
+OPERATIONS = tuple('%s_to_%s' % (from_format, to_format) for from_format in FORMATS for to_format in FORMATS if from_format != to_format)
+
+_FROM = {
+	'spaces': lambda text, tab_width, engine=None: Text(text).from_spaces(tab_width, engine=engine),
+	'elastic_tabstops': lambda text, tab_width, engine=None: Text(text).from_elastic_tabstops(engine=engine),
+	'fixed_tabstops': lambda text, tab_width, engine=None: Text(text).from_fixed_tabstops(tab_width, engine=engine),
+}
+
+_TO = {
+	'spaces': lambda table, tab_width, multiples_of_tab_width, engine=None: table.to_spaces(tab_width, multiples_of_tab_width, engine=engine),
+	'elastic_tabstops': lambda table, tab_width, multiples_of_tab_width, engine=None: table.to_elastic_tabstops(engine=engine),
+	'fixed_tabstops': lambda table, tab_width, multiples_of_tab_width, engine=None: table.to_fixed_tabstops(tab_width, engine=engine),
+}
+
+
+def split_operation(op):
+	"""Return the from and to formats of a named operation."""
+
+	if op not in OPERATIONS:
+		raise ValueError("Unknown operation %r (expected one of %s)." % (op, ', '.join(OPERATIONS)))
+	from_format, _, to_format = op.partition('_to_')
+	return from_format, to_format
+
+
+def convert_text(text, op, tab_width=8, multiples_of_tab_width=False, engine=None):
+	"""Convert text using a named operation (one of OPERATIONS) and return the result as a string.
+
+	If given, engine ('auto', or 'serial' which every conversion has) is passed to both halves of the conversion.
+	"""
+
+	from_format, to_format = split_operation(op)
+	return str(_TO[to_format](_FROM[from_format](text, tab_width, engine), tab_width, multiples_of_tab_width, engine))
+
+
+def _convert_item(item, op, tab_width, multiples_of_tab_width):
+	"""Convert a string or Text using a named operation, or a Table using its to format, returning a string."""
+
+	if isinstance(item, Table):
+		return str(_TO[split_operation(op)[1]](item, tab_width, multiples_of_tab_width))
+	return convert_text(str(item), op, tab_width, multiples_of_tab_width)
+
+
+def _threads_run_in_parallel():
+	"""Check whether Python threads can run Python code on more than one core at once (ie. this is a free-threaded build with the GIL disabled)."""
+
+	is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+	return is_gil_enabled is not None and not is_gil_enabled() and (os.cpu_count() or 1) > 1
+
+
+def convert_many(items, op, tab_width=8, multiples_of_tab_width=False, executor=None):
+	"""Convert each of items (strings, Text or Table objects) using a named operation, returning a list of the resulting strings in the same order.
+
+	Tables are converted using only the to format of op. The conversions run on executor (eg. a
+	concurrent.futures.ThreadPoolExecutor shared by a web service) if given. Otherwise they run on a thread pool
+	if threads can run in parallel (free-threaded builds of Python 3.13 and later), and one after the other if
+	they can't, as with the GIL threads would only add overhead to these CPU bound conversions. The conversions
+	share no mutable state so they're safe to run on any number of threads.
+	"""
+
+	split_operation(op)
+	items = list(items)
+	args = (items, itertools.repeat(op), itertools.repeat(tab_width), itertools.repeat(multiples_of_tab_width))
+	if executor is not None:
+		return list(executor.map(_convert_item, *args))
+	if len(items) < 2 or not _threads_run_in_parallel():
+		return list(map(_convert_item, *args))
+	with concurrent.futures.ThreadPoolExecutor() as pool_executor:
+		return list(pool_executor.map(_convert_item, *args))
+
+
+def is_converted(text, to_format, tab_width=8, multiples_of_tab_width=False):
+	"""Check whether text is already in the canonical form of a format, so converting to it would leave the text unchanged."""
+
+	if to_format == 'spaces':
+		return Text(text).is_aligned_spaces(tab_width, multiples_of_tab_width)
+	if to_format == 'elastic_tabstops':
+		return Text(text).is_canonical_elastic(tab_width, multiples_of_tab_width)
+	if to_format == 'fixed_tabstops':
+		return convert_text(convert_text(text, 'fixed_tabstops_to_elastic_tabstops', tab_width), 'elastic_tabstops_to_fixed_tabstops', tab_width) == text
+	raise ValueError("Unknown format %r (expected one of %s)." % (to_format, ', '.join(FORMATS)))
@@ -0,0 +1,114 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""
+Conversion of very wide tables to spaces aligned text, with the column block widths computed by worker processes.
+
+Each column's blocks only depend on the lengths of its own cells and whether the next column's cells exist, so
+groups of columns can be sized independently. The cell lengths are put in a matrix in shared memory (with -1 for
+cells which don't exist) rather than being pickled for each worker, and the workers write the width of each
+terminated cell's block into a second shared matrix. The text is then rendered once in the calling process.
+"""
+
+from array import array
+import concurrent.futures
+import os
+
+try:
+	from multiprocessing import shared_memory
+except ImportError:
+	shared_memory = None
+
+from elastictabstops.convert import _min_cell_width
+
+# the matrix of cell lengths is only worth building if it isn't mostly padding for missing cells
+MAX_MATRIX_TO_CELLS_RATIO = 4
+
+_ITEM_FORMAT = 'i'
+_ITEM_SIZE = array(_ITEM_FORMAT).itemsize
+
+
+def _size_columns(lengths_name, widths_name, nof_lines, nof_columns, start_column, stop_column, tab_width, multiples_of_tab_width):
+	"""Worker which writes the block width of every terminated cell in columns start_column up to stop_column into the widths matrix."""
+
+	# pool workers share their parent's resource tracker, so attaching doesn't stop the parent unlinking the blocks
+	lengths_shm = shared_memory.SharedMemory(lengths_name)
+	widths_shm = shared_memory.SharedMemory(widths_name)
+	try:
+		lengths = lengths_shm.buf.cast(_ITEM_FORMAT)
+		widths = widths_shm.buf.cast(_ITEM_FORMAT)
+		for cell_num in range(start_column, min(stop_column, nof_columns - 1)):
+			block = []
+			max_length = -1
+			# an extra iteration past the last line ends the final block
+			for line_num in range(nof_lines + 1):
+				index = line_num * nof_columns + cell_num
+				if line_num < nof_lines and lengths[index + 1] >= 0:
+					block.append(index)
+					max_length = max(max_length, lengths[index])
+				elif block:
+					width = _min_cell_width(max_length, tab_width, multiples_of_tab_width)
+					for block_index in block:
+						widths[block_index] = width
+					block = []
+					max_length = -1
+		lengths.release()
+		widths.release()
+	finally:
+		lengths_shm.close()
+		widths_shm.close()
+
+
+def _parallel_to_spaces(table, tab_width, multiples_of_tab_width=False, lengths=None, processes=None):
+	"""Convert table to spaces aligned text like _to_spaces(), sizing groups of columns in up to processes worker processes.
+
+	Tables which are ragged (so the matrix would mostly be padding), and Pythons without shared memory, are converted in this process.
+	"""
+
+	from elastictabstops.convert import _to_spaces
+
+	nof_lines = len(table)
+	nof_columns = max([len(row) for row in table] + [0])
+	nof_cells = sum([len(row) for row in table])
+	if shared_memory is None or nof_columns < 2 or nof_lines * nof_columns > MAX_MATRIX_TO_CELLS_RATIO * nof_cells:
+		return _to_spaces(table, tab_width, multiples_of_tab_width, lengths)
+
+	matrix_size = nof_lines * nof_columns * _ITEM_SIZE
+	lengths_shm = shared_memory.SharedMemory(create=True, size=matrix_size)
+	widths_shm = shared_memory.SharedMemory(create=True, size=matrix_size)
+	try:
+		matrix = array(_ITEM_FORMAT, [-1]) * (nof_lines * nof_columns)
+		for line_num, row in enumerate(table):
+			offset = line_num * nof_columns
+			matrix[offset:offset + len(row)] = array(_ITEM_FORMAT, map(len, row) if lengths is None else lengths[line_num])
+		lengths_shm.buf[:matrix_size] = matrix.tobytes()
+		del matrix
+
+		nof_workers = processes or os.cpu_count() or 1
+		columns_per_worker = -(-(nof_columns - 1) // nof_workers)
+		with concurrent.futures.ProcessPoolExecutor(nof_workers) as executor:
+			futures = [executor.submit(_size_columns, lengths_shm.name, widths_shm.name, nof_lines, nof_columns, start_column, start_column + columns_per_worker, tab_width, multiples_of_tab_width) for start_column in range(0, nof_columns - 1, columns_per_worker)]
+			for future in futures:
+				future.result()
+
+		widths = widths_shm.buf.cast(_ITEM_FORMAT)
+		try:
+			lines = []
+			for line_num, row in enumerate(table):
+				offset = line_num * nof_columns
+				padded_cells = [cell + ' ' * (widths[offset + cell_num] - len(cell)) for cell_num, cell in enumerate(row[:-1])]
+				padded_cells.extend(row[-1:])
+				lines.append(''.join(padded_cells))
+		finally:
+			widths.release()
+		return '\n'.join(lines)
+	finally:
+		lengths_shm.close()
+		lengths_shm.unlink()
+		widths_shm.close()
+		widths_shm.unlink()
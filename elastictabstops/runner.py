@@ -0,0 +1,193 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""Runs conversions over the files in a git repository (eg. from a pre-commit hook), caching the results on disk."""
+
+import hashlib
+import os
+import subprocess
+import tempfile
+
+from elastictabstops import __version__
+from elastictabstops.operations import convert_text, split_operation
+
+# the cache lives in this directory inside the repository's git directory, so that it's never committed
+CACHE_DIR_NAME = 'elastictabstops-cache'
+DEFAULT_MAX_CACHE_SIZE = 64 * 1024 * 1024
+
+# cache entries start with one of these, followed by the converted text if it differs from the input
+_UNCHANGED = b'='
+_CHANGED = b'+'
+
+
+def default_cache_dir(repo_path='.'):
+	"""Return the path of the cache directory inside the git directory of the repository containing repo_path (or in repo_path if it isn't in one)."""
+
+	try:
+		git_dir = subprocess.check_output(['git', 'rev-parse', '--git-dir'], cwd=repo_path, stderr=subprocess.DEVNULL).decode('utf-8').strip()
+	except (OSError, subprocess.CalledProcessError):
+		return os.path.join(repo_path, '.' + CACHE_DIR_NAME)
+	return os.path.join(repo_path, git_dir, CACHE_DIR_NAME)
+
+
+class ResultCache(object):
+	"""An on-disk cache of conversion results, keyed by the hash of the input, the conversion, the tab width and the package version."""
+
+	__slots__ = ['path', 'max_size']
+
+	def __init__(self, path=None, max_size=DEFAULT_MAX_CACHE_SIZE):
+		self.path = path or default_cache_dir()
+		self.max_size = max_size
+
+	def key(self, data, op, tab_width, multiples_of_tab_width=False):
+		"""Return the cache key for converting data (bytes) with a named operation."""
+
+		params = '%s:%s:%d:%d:' % (__version__, op, tab_width, multiples_of_tab_width)
+		return hashlib.sha256(params.encode('ascii') + hashlib.sha256(data).digest()).hexdigest()
+
+	def _entry_path(self, key):
+		return os.path.join(self.path, key[:2], key[2:])
+
+	def get(self, key, data):
+		"""Return the cached result of converting data, or None if it isn't cached."""
+
+		entry_path = self._entry_path(key)
+		try:
+			with open(entry_path, 'rb') as fp:
+				entry = fp.read()
+		except (IOError, OSError):
+			return None
+		# entries are pruned least recently used first
+		os.utime(entry_path, None)
+		return data if entry[:1] == _UNCHANGED else entry[1:]
+
+	def put(self, key, data, result):
+		"""Cache the result of converting data."""
+
+		entry_path = self._entry_path(key)
+		entry_dir = os.path.dirname(entry_path)
+		if not os.path.isdir(entry_dir):
+			os.makedirs(entry_dir)
+		# write to a temporary file and rename it so that concurrent runs never see partial entries
+		fd, temp_path = tempfile.mkstemp(dir=entry_dir)
+		with os.fdopen(fd, 'wb') as fp:
+			fp.write(_UNCHANGED if result == data else _CHANGED + result)
+		os.replace(temp_path, entry_path)
+
+	def prune(self, max_size=None):
+		"""Delete the least recently used entries until the cache is no bigger than max_size bytes (by default self.max_size), returning how many were deleted."""
+
+		if max_size is None:
+			max_size = self.max_size
+		entries = []
+		total_size = 0
+		for dir_path, _, file_names in os.walk(self.path):
+			for file_name in file_names:
+				entry_path = os.path.join(dir_path, file_name)
+				entry_stat = os.stat(entry_path)
+				entries.append((entry_stat.st_mtime, entry_stat.st_size, entry_path))
+				total_size += entry_stat.st_size
+
+		nof_deleted = 0
+		for _, size, entry_path in sorted(entries):
+			if total_size <= max_size:
+				break
+			os.unlink(entry_path)
+			total_size -= size
+			nof_deleted += 1
+		return nof_deleted
+
+
+def staged_files(repo_path='.'):
+	"""Return the paths of the files which are staged to be added or modified in a git repository."""
+
+	# names are relative to the top of the working tree, whichever directory repo_path is
+	top = subprocess.check_output(['git', 'rev-parse', '--show-toplevel'], cwd=repo_path).decode('utf-8').strip()
+	output = subprocess.check_output(['git', 'diff', '--cached', '--name-only', '--diff-filter=ACMR', '-z'], cwd=repo_path)
+	return [os.path.join(top, name) for name in output.decode('utf-8').split('\0') if name]
+
+
+def _read_staged(path):
+	"""Return the index entry of a file (its mode and path relative to the top of the working tree) and the content of its staged blob."""
+
+	directory, name = os.path.split(os.path.abspath(path))
+	entry = subprocess.check_output(['git', 'ls-files', '--stage', '--full-name', '-z', '--', name], cwd=directory).decode('utf-8')
+	# entries are "<mode> <object name> <stage>\t<path>\0"
+	info, _, full_name = entry.rstrip('\0').partition('\t')
+	mode, object_name = info.split(' ')[:2]
+	return (mode, full_name), subprocess.check_output(['git', 'cat-file', 'blob', object_name], cwd=directory)
+
+
+def _write_staged(path, index_entry, data):
+	"""Stage data as the content of a file with an index entry returned by _read_staged(), without touching the working tree."""
+
+	directory = os.path.dirname(os.path.abspath(path))
+	process = subprocess.run(['git', 'hash-object', '-w', '--stdin'], input=data, stdout=subprocess.PIPE, cwd=directory, check=True)
+	object_name = process.stdout.decode('ascii').strip()
+	mode, full_name = index_entry
+	subprocess.check_call(['git', 'update-index', '--cacheinfo', '%s,%s,%s' % (mode, object_name, full_name)], cwd=directory)
+
+
+def run(paths, op, tab_width=8, multiples_of_tab_width=False, cache=None, check=False, staged=False):
+	"""Convert files in place with a named operation (or if check is set, leave them alone) and return the paths of the files which changed (or would change).
+
+	If staged is set, the content staged in git for each file is what's converted and checked, and the result is
+	staged as well as written to the working tree (which is converted too if it has unstaged changes).
+	Files whose content has been converted before are looked up in cache (a ResultCache) rather than being converted again. Files which aren't UTF-8 are skipped.
+	"""
+
+	split_operation(op)
+	changed_paths = []
+	added_to_cache = False
+	for path in paths:
+		with open(path, 'rb') as fp:
+			data = fp.read()
+		if staged:
+			index_entry, staged_data = _read_staged(path)
+			result, added = _converted(staged_data, op, tab_width, multiples_of_tab_width, cache)
+			added_to_cache |= added
+			if result is None or result == staged_data:
+				continue
+			changed_paths.append(path)
+			if not check:
+				_write_staged(path, index_entry, result)
+				if data != staged_data:
+					data_result, added = _converted(data, op, tab_width, multiples_of_tab_width, cache)
+					added_to_cache |= added
+					result = data if data_result is None else data_result
+		else:
+			result, added = _converted(data, op, tab_width, multiples_of_tab_width, cache)
+			added_to_cache |= added
+			if result is None or result == data:
+				continue
+			changed_paths.append(path)
+
+		if not check and result != data:
+			with open(path, 'wb') as fp:
+				fp.write(result)
+
+	if added_to_cache:
+		cache.prune()
+	return changed_paths
+
+
+def _converted(data, op, tab_width, multiples_of_tab_width, cache):
+	"""Return data converted with a named operation (or None if it isn't UTF-8), and whether the result was added to cache rather than found in it."""
+
+	key = cache.key(data, op, tab_width, multiples_of_tab_width) if cache is not None else None
+	result = cache.get(key, data) if cache is not None else None
+	if result is not None:
+		return result, False
+	try:
+		text = data.decode('utf-8')
+	except UnicodeDecodeError:
+		return None, False
+	result = convert_text(text, op, tab_width, multiples_of_tab_width).encode('utf-8')
+	if cache is not None:
+		cache.put(key, data, result)
+	return result, cache is not None
@@ -0,0 +1,141 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""
+A long-running conversion server listening on a Unix domain socket, and a client for it.
+
+Keeping a process warm saves editors from paying for interpreter startup and imports on every conversion.
+Each connection can send any number of requests, one after the other. A request is a header packed as
+REQUEST_HEADER (the lengths of the operation name and payload, and the tab width) followed by the
+operation name (one of operations.OPERATIONS) and the UTF-8 encoded text to convert. A response is a header
+packed as RESPONSE_HEADER (a status and the payload length) followed by the UTF-8 encoded converted text,
+or by an error message if the status isn't STATUS_OK.
+"""
+
+import errno
+import os
+import socket
+import socketserver
+import stat
+import struct
+
+from elastictabstops.operations import convert_text
+
+REQUEST_HEADER = struct.Struct('!HHI')
+RESPONSE_HEADER = struct.Struct('!BI')
+
+STATUS_OK = 0
+STATUS_VALUE_ERROR = 1
+STATUS_TYPE_ERROR = 2
+
+
+def _read_exactly(fp, size):
+	"""Read size bytes from fp, returning None if the stream ends first."""
+
+	data = fp.read(size)
+	return data if len(data) == size else None
+
+
+class _ConversionHandler(socketserver.StreamRequestHandler):
+	"""Handles the requests sent over one client connection."""
+
+	def handle(self):
+		while True:
+			header = _read_exactly(self.rfile, REQUEST_HEADER.size)
+			if header is None:
+				return
+			op_length, tab_width, payload_length = REQUEST_HEADER.unpack(header)
+			op = _read_exactly(self.rfile, op_length)
+			payload = _read_exactly(self.rfile, payload_length)
+			if op is None or payload is None:
+				return
+
+			try:
+				status, result = STATUS_OK, convert_text(payload.decode('utf-8'), op.decode('ascii'), tab_width)
+			except (ValueError, UnicodeDecodeError) as err:
+				status, result = STATUS_VALUE_ERROR, str(err)
+			except TypeError as err:
+				status, result = STATUS_TYPE_ERROR, str(err)
+			body = result.encode('utf-8')
+			self.wfile.write(RESPONSE_HEADER.pack(status, len(body)) + body)
+
+
+class ConversionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	"""Serves conversion requests, handling each client connection in its own thread."""
+
+	daemon_threads = True
+
+	def __init__(self, socket_path):
+		# a socket file left behind by a server which didn't shut down cleanly would stop us binding, but one which
+		# a server is still listening on is left alone
+		if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+			probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			try:
+				probe.connect(socket_path)
+			except ConnectionRefusedError:
+				os.unlink(socket_path)
+			else:
+				raise OSError(errno.EADDRINUSE, "A server is already listening on %r." % socket_path)
+			finally:
+				probe.close()
+		socketserver.UnixStreamServer.__init__(self, socket_path, _ConversionHandler)
+
+	def server_close(self):
+		socketserver.UnixStreamServer.server_close(self)
+		if os.path.exists(self.server_address):
+			os.unlink(self.server_address)
+
+
+def serve(socket_path):
+	"""Serve conversion requests on a Unix domain socket until interrupted."""
+
+	with ConversionServer(socket_path) as server:
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+
+
+class Client(object):
+	"""A connection to a conversion server which can be used for any number of requests."""
+
+	__slots__ = ['sock', 'rfile']
+
+	def __init__(self, socket_path):
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.connect(socket_path)
+		self.rfile = self.sock.makefile('rb')
+
+	def convert(self, text, op, tab_width=8):
+		"""Convert text using a named operation on the server and return the result as a string."""
+
+		op_bytes = op.encode('ascii')
+		payload = text.encode('utf-8')
+		self.sock.sendall(REQUEST_HEADER.pack(len(op_bytes), tab_width, len(payload)) + op_bytes + payload)
+
+		header = _read_exactly(self.rfile, RESPONSE_HEADER.size)
+		if header is None:
+			raise ConnectionError("The conversion server closed the connection.")
+		status, length = RESPONSE_HEADER.unpack(header)
+		body = _read_exactly(self.rfile, length)
+		if body is None:
+			raise ConnectionError("The conversion server closed the connection.")
+		result = body.decode('utf-8')
+		if status == STATUS_VALUE_ERROR:
+			raise ValueError(result)
+		if status == STATUS_TYPE_ERROR:
+			raise TypeError(result)
+		return result
+
+	def close(self):
+		self.rfile.close()
+		self.sock.close()
+
+	def __enter__(self): return self
+
+	def __exit__(self, *exc_info): self.close()
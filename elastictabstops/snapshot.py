@@ -0,0 +1,151 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""
+Snapshots of a table's column block layout which can be saved alongside a document, so that reopening it can
+skip straight to rendering. For example:
+
+	with Table.open_elastic('huge.tsv') as table:
+		try:
+			snapshot = LayoutSnapshot.load('huge.tsv.layout', table)
+		except (IOError, ValueError):
+			snapshot = LayoutSnapshot.compute(table)
+			snapshot.save('huge.tsv.layout')
+		spaces_text = table.to_spaces(4, layout=snapshot)
+
+A snapshot holds the number of the block each terminated cell is in and the length of the longest cell in each
+block, so it doesn't depend on the tab width. The file is a header packed as HEADER (MAGIC, VERSION, the byte
+order, the SHA-256 hash of the table's UTF-8 encoded elastic tabstops text, and the numbers of rows, terminated
+cells and blocks) followed by arrays of each row's offset into the block numbers, the block numbers and the
+longest cell lengths. Loading memory-maps the file rather than reading it.
+"""
+
+from array import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+from elastictabstops.convert import _block_structure, _min_cell_width
+from elastictabstops.stream import MappedElasticRows
+
+MAGIC = b'ETLAYOUT'
+VERSION = 1
+HEADER = struct.Struct('<8sIB3x32sQQQ')
+
+_BYTE_ORDERS = {'little': 0, 'big': 1}
+
+
+def table_hash(table):
+	"""Return the SHA-256 digest of a table's elastic tabstops text encoded as UTF-8."""
+
+	if isinstance(table, MappedElasticRows) and table.encoding.lower().replace('-', '') == 'utf8':
+		# the mapped file is already the encoded text
+		return table.sha256()
+	digest = hashlib.sha256()
+	for line_num, row in enumerate(table):
+		if line_num:
+			digest.update(b'\n')
+		digest.update('\t'.join(row).encode('utf-8'))
+	return digest.digest()
+
+
+class LayoutSnapshot(object):
+	"""The column block layout of a table, computed or loaded from a file, which can be passed to Table.to_spaces(layout=...)."""
+
+	__slots__ = ['source_hash', 'nrows', 'offsets', 'block_nums', 'max_lengths', '_mmap']
+
+	def __init__(self, source_hash, offsets, block_nums, max_lengths, mapping=None):
+		self.source_hash = source_hash
+		self.nrows = len(offsets) - 1
+		self.offsets = offsets
+		self.block_nums = block_nums
+		self.max_lengths = max_lengths
+		self._mmap = mapping
+
+	@classmethod
+	def compute(cls, table):
+		"""Compute the layout of a table (a Table or list of rows) by running the block passes."""
+
+		rows = getattr(table, 'list', table)
+		lengths = [array('i', map(len, row)) for row in rows]
+		row_block_nums, max_lengths = _block_structure(lengths, lengths)
+		offsets = array('q', [0])
+		block_nums = array('i')
+		for row_nums in row_block_nums:
+			block_nums.extend(row_nums.tolist())
+			offsets.append(len(block_nums))
+		return cls(table_hash(rows), offsets, block_nums, array('i', max_lengths))
+
+	def save(self, path):
+		"""Write the snapshot to a file."""
+
+		with open(path, 'wb') as fp:
+			fp.write(HEADER.pack(MAGIC, VERSION, _BYTE_ORDERS[sys.byteorder], self.source_hash, self.nrows, len(self.block_nums), len(self.max_lengths)))
+			fp.write(memoryview(self.offsets).cast('B'))
+			fp.write(memoryview(self.block_nums).cast('B'))
+			fp.write(memoryview(self.max_lengths).cast('B'))
+
+	@classmethod
+	def load(cls, path, table=None):
+		"""Memory-map a snapshot file, raising a ValueError if it isn't one or (if table is given) if it's the layout of a different table."""
+
+		with open(path, 'rb') as fp:
+			size = os.fstat(fp.fileno()).st_size
+			if size < HEADER.size:
+				raise ValueError("%r isn't a layout snapshot file." % path)
+			mapping = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			magic, version, byte_order, source_hash, nrows, nof_cells, nof_blocks = HEADER.unpack_from(mapping)
+			if magic != MAGIC or version != VERSION:
+				raise ValueError("%r isn't a version %d layout snapshot file." % (path, VERSION))
+			if byte_order != _BYTE_ORDERS[sys.byteorder]:
+				raise ValueError("%r was written on a machine with a different byte order." % path)
+			if size != HEADER.size + (nrows + 1) * 8 + nof_cells * 4 + nof_blocks * 4:
+				raise ValueError("%r is truncated or corrupt." % path)
+			if table is not None and table_hash(getattr(table, 'list', table)) != source_hash:
+				raise ValueError("%r is the layout of a different version of the table." % path)
+
+			view = memoryview(mapping)
+			start = HEADER.size
+			offsets = view[start:start + (nrows + 1) * 8].cast('q')
+			start += (nrows + 1) * 8
+			block_nums = view[start:start + nof_cells * 4].cast('i')
+			start += nof_cells * 4
+			max_lengths = view[start:start + nof_blocks * 4].cast('i')
+		except Exception:
+			mapping.close()
+			raise
+		return cls(source_hash, offsets, block_nums, max_lengths, mapping)
+
+	def iter_block_nums(self):
+		"""Yield the block numbers of each row's terminated cells."""
+
+		offsets = self.offsets
+		block_nums = self.block_nums
+		for line_num in range(self.nrows):
+			yield block_nums[offsets[line_num]:offsets[line_num + 1]]
+
+	def widths(self, tab_width, multiples_of_tab_width=False):
+		"""Return the width of each block for a tab width."""
+
+		return [_min_cell_width(max_length, tab_width, multiples_of_tab_width) for max_length in self.max_lengths]
+
+	def close(self):
+		"""Unmap the file, if the snapshot was loaded from one."""
+
+		if self._mmap is not None:
+			for view in (self.offsets, self.block_nums, self.max_lengths):
+				view.release()
+			self._mmap.close()
+			self._mmap = None
+
+	def __enter__(self): return self
+
+	def __exit__(self, *exc_info): self.close()
@@ -0,0 +1,174 @@
+# Copyright (c) 2007-2022 Nick Gravgaard <nick@nickgravgaard.com>
+# This code is licensed under the MIT Licence - see LICENCE.txt
+
+# This file tries to follow the Style Guide for Python Code (PEP 8) *EXCEPT*
+#  * it uses tabs for indenting (like Guido used to recommend)
+#  * it doesn't follow the Maximum Line Length rule
+# use pylint as following: pylint --indent-string='\t' --max-line-length=1000 elastictabstops
+
+"""Conversions which stream text from files rather than holding it all in memory."""
+
+from array import array
+import bz2
+from collections.abc import Sequence
+import gzip
+import hashlib
+import lzma
+import mmap
+import os
+
+from elastictabstops.convert import _block_widths, _iter_padded_lines
+
+
+_EXTENSIONS = {'.gz': gzip, '.bz2': bz2, '.xz': lzma}
+
+
+def _compression_module(path, mode):
+	"""Return the module (gzip, bz2 or lzma) to open path with, or None if it isn't compressed.
+
+	Files being read are recognised by their magic bytes, and files being written by their extension.
+	"""
+
+	if 'r' in mode:
+		with open(path, 'rb') as fp:
+			magic = fp.read(10)
+		if magic.startswith(b'\x1f\x8b'):
+			return gzip
+		if magic.startswith(b'\xfd7zXZ\x00'):
+			return lzma
+		# 'BZh' could start a text file, so the block size digit and the first block's header (or the end of stream
+		# marker of an empty stream) are checked too
+		if magic.startswith(b'BZh') and magic[3:4].isdigit() and magic[4:10] in (b'1AY&SY', b'\x17rE8P\x90'):
+			return bz2
+		return None
+	return _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def open_text(path, mode='r', encoding='utf-8'):
+	"""Open a text file for reading ('r') or writing ('w'), decompressing or compressing gzip, bz2 and xz files.
+
+	Compressed files are decompressed and compressed a buffer at a time as they're read and written, so neither
+	copy is held in memory. Newlines aren't translated.
+	"""
+
+	module = _compression_module(path, mode)
+	if module is None:
+		return open(path, mode, encoding=encoding, newline='\n')
+	return module.open(path, mode + 't', encoding=encoding, newline='\n')
+
+
+def _read_rows(fp):
+	"""Yield the cells of each line of elastic tabstops aligned text read from fp (like str.split('\\n') would)."""
+
+	ends_with_newline = True
+	for line in fp:
+		ends_with_newline = line.endswith('\n')
+		if ends_with_newline:
+			line = line[:-1]
+		yield line.split('\t')
+	# text which is empty or ends with a newline has a final empty line
+	if ends_with_newline:
+		yield ['']
+
+
+def _write_lines(fp, lines):
+	"""Write lines to fp separated by newlines."""
+
+	first = True
+	for line in lines:
+		if not first:
+			fp.write('\n')
+		fp.write(line)
+		first = False
+
+
+def elastic_tabstops_to_spaces(source, dest, tab_width=8, multiples_of_tab_width=False, encoding='utf-8'):
+	"""Convert elastic tabstops aligned text to spaces aligned text using two passes over a re-readable source.
+
+	source is a file path or a seekable text stream, and dest is a file path or a writable text stream. The
+	first pass only records the width of each column block, so memory use is proportional to the number of
+	blocks rather than the size of the text. The output is the same as Text.from_elastic_tabstops().to_spaces().
+	Compressed files are read and written as they're streamed (see open_text()).
+	"""
+
+	if not isinstance(tab_width, int):
+		raise TypeError("The third parameter of elastic_tabstops_to_spaces ('tab_width') should be an integer.")
+	if tab_width < 2:
+		raise ValueError("The third parameter of elastic_tabstops_to_spaces ('tab_width') should be 2 or greater.")
+
+	if isinstance(source, str):
+		with open_text(source, 'r', encoding) as source_fp:
+			return elastic_tabstops_to_spaces(source_fp, dest, tab_width, multiples_of_tab_width, encoding)
+	if isinstance(dest, str):
+		with open_text(dest, 'w', encoding) as dest_fp:
+			return elastic_tabstops_to_spaces(source, dest_fp, tab_width, multiples_of_tab_width, encoding)
+
+	if not source.seekable():
+		raise ValueError("The first parameter of elastic_tabstops_to_spaces ('source') should be a file path or a seekable stream.")
+
+	start = source.tell()
+	widths = _block_widths(_read_rows(source), tab_width, multiples_of_tab_width)
+	source.seek(start)
+	_write_lines(dest, _iter_padded_lines(_read_rows(source), widths))
+
+
+class MappedElasticRows(Sequence):
+	"""The rows of an elastic tabstops aligned file, which is memory-mapped and only split into cells as rows are accessed.
+
+	Opening the file builds an array of line offsets in one scan, so the memory used is about 8 bytes per line.
+	The encoding must be ASCII compatible (such as UTF-8) so that newlines can be found in the undecoded bytes.
+	"""
+
+	__slots__ = ['path', 'encoding', '_file', '_data', '_offsets']
+
+	def __init__(self, path, encoding='utf-8'):
+		if _compression_module(path, 'r') is not None:
+			raise ValueError("Compressed files can't be memory-mapped (use elastic_tabstops_to_spaces() to stream them instead).")
+		self.path = path
+		self.encoding = encoding
+		self._file = open(path, 'rb')
+		size = os.fstat(self._file.fileno()).st_size
+		# empty files can't be memory-mapped
+		self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b''
+
+		# line n is the bytes from _offsets[n] up to the newline before _offsets[n + 1]
+		offsets = array('q', [0])
+		pos = self._data.find(b'\n')
+		while pos != -1:
+			offsets.append(pos + 1)
+			pos = self._data.find(b'\n', pos + 1)
+		offsets.append(size + 1)
+		self._offsets = offsets
+
+	def __len__(self): return len(self._offsets) - 1
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return [self[line_num] for line_num in range(*i.indices(len(self)))]
+		if i < 0:
+			i += len(self)
+		if not 0 <= i < len(self):
+			raise IndexError("MappedElasticRows index out of range")
+		return self._data[self._offsets[i]:self._offsets[i + 1] - 1].decode(self.encoding).split('\t')
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self[i]
+
+	def __repr__(self): return '<MappedElasticRows %r (%d lines)>' % (self.path, len(self))
+
+	def __eq__(self, other):
+		if isinstance(other, (list, MappedElasticRows)):
+			return len(self) == len(other) and all(row == other_row for row, other_row in zip(self, other))
+		return False
+
+	def __ne__(self, other): return not self.__eq__(other)
+
+	def sha256(self):
+		"""Return the SHA-256 digest of the file's undecoded bytes."""
+		return hashlib.sha256(self._data).digest()
+
+	def close(self):
+		if isinstance(self._data, mmap.mmap):
+			self._data.close()
+		self._file.close()
@@ -1,9 +1,25 @@
 """Test cases for testing ElasticTabstops."""
 
+import io
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import tracemalloc
 import unittest
 
-from elastictabstops.classes import Text, Table
-from elastictabstops.convert import _cell_exists, _get_positions_contents
+from elastictabstops import fuzz
+from elastictabstops.classes import Text, Table, LiveTable, TableFormatter
+from elastictabstops.convert import Limits, TokenCache, _cell_exists, _get_positions_contents
+from elastictabstops.operations import convert_text
+from elastictabstops.stream import elastic_tabstops_to_spaces
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 
 ET_TEXT_1 = r"""
@@ -832,6 +848,697 @@ class TestElasticTabstops(unittest.TestCase):
 			new_table = Text(test_strings['space_text']).from_spaces(test_strings['tab_width'])
 			self.assertEqual(orig_table, new_table)
 
+	def test_elastic_tabstops_to_spaces_two_pass(self):
+		"""Test elastic_tabstops_to_spaces()."""
+		for test_strings in TEST_STRINGS_LIST:
+			for multiples_of_tab_width in (False, True):
+				orig_spaces = Table(test_strings['table']).to_spaces(test_strings['tab_width'], multiples_of_tab_width=multiples_of_tab_width)
+				dest = io.StringIO()
+				elastic_tabstops_to_spaces(io.StringIO(test_strings['et_text'], newline='\n'), dest, test_strings['tab_width'], multiples_of_tab_width)
+				self.assertEqual(orig_spaces, dest.getvalue(), show_debug_info(orig_spaces, dest.getvalue()))
+		for text in ('', 'abc', 'a\tb\nc\td\n\n'):
+			dest = io.StringIO()
+			elastic_tabstops_to_spaces(io.StringIO(text, newline='\n'), dest)
+			self.assertEqual(Text(text).from_elastic_tabstops().to_spaces(), dest.getvalue())
+
+	def test_bulk_construction(self):
+		"""Test Table.from_records(), Table.from_csv() and Table.from_array()."""
+		records = [('Generation X', 1995, 4.5), ('Informagic', 1982, None)]
+		table = Table.from_records(records, columns=['Title', 'Year', 'Rating'], fmt=[None, '%d', '%.2f'], header=True)
+		self.assertEqual(table, [['Title', 'Year', 'Rating'], ['Generation X', '1995', '4.50'], ['Informagic', '1982', '']])
+		self.assertEqual(table.lengths, [[len(cell) for cell in row] for row in table])
+		self.assertEqual(table.to_spaces(), Table(table.list).to_spaces())
+
+		dict_records = [{'Title': 'Generation X', 'Year': 1995}, {'Title': 'Informagic', 'Year': 1982}]
+		self.assertEqual(Table.from_records(dict_records, header=True), [['Title', 'Year'], ['Generation X', '1995'], ['Informagic', '1982']])
+		with self.assertRaises(ValueError):
+			Table.from_records(records, header=True)
+
+		table = Table.from_csv(io.StringIO('Title,Year\r\n"Informagic, 2nd ed.",1982\r\n'))
+		self.assertEqual(table, [['Title', 'Year'], ['Informagic, 2nd ed.', '1982']])
+		self.assertEqual(table.lengths, [[5, 4], [19, 4]])
+
+		self.assertEqual(Table.from_array([[1, 2.5], [30, 4]], fmt='%.1f'), [['1.0', '2.5'], ['30.0', '4.0']])
+		with self.assertRaises(ValueError):
+			Table.from_records([(1, 2, 3)], fmt=['%d', '%.1f'])
+
+		# the lengths computed while building the table are forgotten once its rows could have been modified
+		table = Table.from_records([('a', 'b'), ('c', 'd')])
+		table.list[0][0] = 'longer'
+		self.assertEqual(table.to_spaces(4), 'longer  b\nc       d')
+		table = Table.from_records([('a', 'b'), ('c', 'd')])
+		table[1][0] = 'longer'
+		self.assertEqual(table.to_spaces(4), 'a       b\nlonger  d')
+
+	@unittest.skipIf(numpy is None, 'NumPy is not installed')
+	def test_from_numpy_array(self):
+		"""Test Table.from_array() with a NumPy array."""
+		values = numpy.array([[1, 2], [300, 4]])
+		self.assertEqual(Table.from_array(values), [['1', '2'], ['300', '4']])
+		table = Table.from_array(values, fmt=['%03d', None])
+		self.assertEqual(table, [['001', '2'], ['300', '4']])
+		self.assertEqual(table.lengths, [[3, 1], [3, 1]])
+		with self.assertRaises(ValueError):
+			Table.from_array(numpy.array([1, 2]))
+		with self.assertRaises(ValueError):
+			Table.from_array(numpy.array([[1, 2]]), fmt=['%d'])
+		objects = numpy.array([['a', None], [1, 'b']], dtype=object)
+		self.assertEqual(Table.from_array(objects), Table.from_records(objects.tolist()))
+		self.assertEqual(Table.from_array(objects), [['a', ''], ['1', 'b']])
+
+		# NumPy is only imported by code which makes arrays, not by importing this package
+		import subprocess
+		code = 'import sys, elastictabstops.classes, elastictabstops.cli; print("numpy" in sys.modules)'
+		self.assertEqual(subprocess.check_output([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).strip(), b'False')
+
+	def test_convert_text(self):
+		"""Test convert_text()."""
+		for test_strings in TEST_STRINGS_LIST:
+			self.assertEqual(test_strings['space_text'], convert_text(test_strings['et_text'], 'elastic_tabstops_to_spaces', test_strings['tab_width']))
+			self.assertEqual(test_strings['et_text'], convert_text(test_strings['space_text'], 'spaces_to_elastic_tabstops', test_strings['tab_width']))
+			self.assertEqual(test_strings['ft_text'], convert_text(test_strings['space_text'], 'spaces_to_fixed_tabstops', test_strings['tab_width']))
+		with self.assertRaises(ValueError):
+			convert_text('abc', 'spaces_to_spaces')
+
+	def test_layout_summaries(self):
+		"""Test that merged layout summaries of chunks match the whole table's and give the same rendering as Table.to_spaces()."""
+		from elastictabstops.layout import EMPTY_SUMMARY, summarize, surrounding_summaries, render_chunk
+		for test_strings in TEST_STRINGS_LIST:
+			rows = test_strings['table']
+			for chunk_size in range(1, len(rows) + 1):
+				chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+				summaries = [summarize(chunk) for chunk in chunks]
+				left = right = EMPTY_SUMMARY
+				for summary, reversed_summary in zip(summaries, reversed(summaries)):
+					left = left.merge(summary)
+					right = reversed_summary.merge(right)
+				self.assertEqual(left, summarize(rows))
+				self.assertEqual(right, summarize(rows))
+				for multiples_of_tab_width in (False, True):
+					texts = [render_chunk(chunk, before, after, test_strings['tab_width'], multiples_of_tab_width) for chunk, (before, after) in zip(chunks, surrounding_summaries(summaries))]
+					self.assertEqual('\n'.join(texts), Table(rows).to_spaces(test_strings['tab_width'], multiples_of_tab_width))
+
+		summary = summarize([['a', 'bb', 'c'], ['ddd', 'e'], ['f'], ['g', 'h']])
+		self.assertEqual(summary, (4, (3, 2), (1,), 0, 0))
+		summary = summary.merge(summarize([['iiii', 'j']]))
+		self.assertEqual(summary, (5, (3, 2), (4,), 0, 0))
+		self.assertEqual(summary.merge(summarize([['k']])), (6, (3, 2), (), 0, 1))
+
+		# chunks with empty rows
+		chunks = [[['q', 'x'], [], ['q', '']], [['q'], [], [], ['q', '', 'bb', 'x'], ['q'], []]]
+		summaries = [summarize(chunk) for chunk in chunks]
+		texts = [render_chunk(chunk, before, after, 4) for chunk, (before, after) in zip(chunks, surrounding_summaries(summaries))]
+		self.assertEqual('\n'.join(texts), Table(chunks[0] + chunks[1]).to_spaces(4))
+
+	def test_conversion_job(self):
+		"""Test that conversion jobs run in steps give the same results as convert_text(), and can be cancelled."""
+		from elastictabstops.job import ConversionJob
+		from elastictabstops.operations import OPERATIONS
+		for test_strings in TEST_STRINGS_LIST:
+			for op in OPERATIONS:
+				text = test_strings['et_text'] if op.startswith('elastic') else test_strings['space_text']
+				progress = []
+				job = ConversionJob(text, op, test_strings['tab_width'], on_progress=progress.append)
+				while not job.run(max_steps=3):
+					pass
+				self.assertEqual(job.result, convert_text(text, op, test_strings['tab_width']))
+				self.assertEqual(progress, sorted(progress))
+				self.assertEqual(progress[-1], 1.0)
+			job = ConversionJob(test_strings['space_text'], 'spaces_to_elastic_tabstops', test_strings['tab_width'], multiples_of_tab_width=True)
+			self.assertTrue(job.run())
+			self.assertEqual(job.result, test_strings['et_text'])
+
+		job = ConversionJob('a  b\n' * 1000, 'spaces_to_fixed_tabstops', 4)
+		self.assertFalse(job.run(max_steps=10))
+		self.assertTrue(0.0 < job.progress < 1.0)
+		job.cancel()
+		self.assertTrue(job.run())
+		self.assertTrue(job.done)
+		self.assertIsNone(job.result)
+		self.assertFalse(ConversionJob('a', 'spaces_to_fixed_tabstops', 4).run(max_time=0.0))
+		with self.assertRaises(ValueError):
+			ConversionJob('a', 'spaces_to_nothing')
+
+	def test_table_formatter(self):
+		"""Test that TableFormatter gives the same text as Table.to_spaces() when reused."""
+		for multiples_of_tab_width in [False, True]:
+			formatter = TableFormatter(4, multiples_of_tab_width)
+			trusted_formatter = TableFormatter(4, multiples_of_tab_width, trusted=True)
+			for test_strings in TEST_STRINGS_LIST:
+				table = Table(test_strings['table'])
+				expected = str(table.to_spaces(4, multiples_of_tab_width))
+				self.assertEqual(formatter.format(table), expected)
+				self.assertEqual(trusted_formatter.format(test_strings['table']), expected)
+		formatter = TableFormatter(4)
+		self.assertEqual(formatter.format([['a' * 100, 'b'], ['c', 'd'], [], ['e']]), 'a' * 100 + '  b\n' + 'c' + ' ' * 101 + 'd\n\ne')
+		# padding for very long cells isn't kept in the lookup lists
+		tracemalloc.start()
+		try:
+			self.assertEqual(formatter.format([['a' * 30000, 'b'], ['c', 'd']]), 'a' * 30000 + '  b\nc' + ' ' * 30001 + 'd')
+			peak = tracemalloc.get_traced_memory()[1]
+		finally:
+			tracemalloc.stop()
+		self.assertLess(peak, 1000000)
+		self.assertEqual(len(formatter._spaces), TableFormatter.MAX_LOOKUP_LENGTH)
+		with self.assertRaises(TypeError):
+			formatter.format([['a', 1]])
+		with self.assertRaises(ValueError):
+			TableFormatter(1)
+
+	def test_convert_many(self):
+		"""Test convert_many() serially and on a thread pool."""
+		import concurrent.futures
+		from elastictabstops.operations import convert_many
+		items = [test_strings['space_text'] for test_strings in TEST_STRINGS_LIST if test_strings['tab_width'] == 4]
+		expected = [convert_text(item, 'spaces_to_elastic_tabstops', 4) for item in items]
+		self.assertEqual(convert_many(items, 'spaces_to_elastic_tabstops', 4), expected)
+		self.assertEqual(convert_many(map(Text, items), 'spaces_to_elastic_tabstops', 4), expected)
+		with concurrent.futures.ThreadPoolExecutor(4) as executor:
+			self.assertEqual(convert_many(items * 20, 'spaces_to_elastic_tabstops', 4, executor=executor), expected * 20)
+		tables = [Table(test_strings['table']) for test_strings in TEST_STRINGS_LIST]
+		self.assertEqual(convert_many(tables, 'elastic_tabstops_to_spaces', 8, True), [str(table.to_spaces(8, True)) for table in tables])
+		self.assertEqual(convert_many([], 'spaces_to_elastic_tabstops'), [])
+		with self.assertRaises(ValueError):
+			convert_many(items, 'spaces_to_nothing')
+
+	@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'Unix domain sockets are not available')
+	def test_server(self):
+		"""Test the conversion server and client."""
+		from elastictabstops.server import ConversionServer, Client, RESPONSE_HEADER, STATUS_OK
+		with tempfile.TemporaryDirectory() as temp_dir:
+			socket_path = os.path.join(temp_dir, 'et.sock')
+			# a socket file nothing is listening on is replaced
+			stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			stale.bind(socket_path)
+			stale.close()
+			with ConversionServer(socket_path) as server:
+				thread = threading.Thread(target=server.serve_forever)
+				thread.start()
+				try:
+					# but one a server is listening on isn't
+					with self.assertRaises(OSError):
+						ConversionServer(socket_path)
+					with Client(socket_path) as client, Client(socket_path) as other_client:
+						for test_strings in TEST_STRINGS_LIST:
+							self.assertEqual(test_strings['space_text'], client.convert(test_strings['et_text'], 'elastic_tabstops_to_spaces', test_strings['tab_width']))
+							self.assertEqual(test_strings['et_text'], other_client.convert(test_strings['space_text'], 'spaces_to_elastic_tabstops', test_strings['tab_width']))
+						with self.assertRaises(ValueError):
+							client.convert('abc', 'spaces_to_elastic_tabstops', 1)
+						self.assertEqual('abc', client.convert('abc', 'elastic_tabstops_to_spaces'))
+				finally:
+					server.shutdown()
+					thread.join()
+			self.assertFalse(os.path.exists(socket_path))
+
+		# a server which closes the connection part way through a response
+		client = Client.__new__(Client)
+		client.sock, server_sock = socket.socketpair()
+		client.rfile = client.sock.makefile('rb')
+		server_sock.sendall(RESPONSE_HEADER.pack(STATUS_OK, 10) + b'abc')
+		server_sock.shutdown(socket.SHUT_WR)
+		with client, server_sock:
+			with self.assertRaises(ConnectionError):
+				client.convert('abc', 'elastic_tabstops_to_spaces')
+
+	def test_git_filter(self):
+		"""Test the git long-running filter process."""
+		from elastictabstops.gitfilter import MAX_PACKET_DATA, run_filter, _read_content, _read_text_packets, _write_content, _write_text_packets
+		test_strings = TEST_STRINGS_LIST[0]
+		long_et_text = test_strings['et_text'] * (2 * MAX_PACKET_DATA // len(test_strings['et_text']))
+		requests = io.BytesIO()
+		_write_text_packets(requests, ['git-filter-client', 'version=2'])
+		_write_text_packets(requests, ['capability=clean', 'capability=smudge', 'capability=delay'])
+		for command, text in [('clean', test_strings['et_text']), ('smudge', test_strings['space_text']), ('clean', long_et_text), ('unknown', 'abc')]:
+			_write_text_packets(requests, ['command=' + command, 'pathname=a.c'])
+			_write_content(requests, text.encode('utf-8'))
+		requests.seek(0)
+
+		responses = io.BytesIO()
+		stderr = sys.stderr
+		sys.stderr = io.StringIO()
+		try:
+			run_filter(requests, responses, test_strings['tab_width'])
+		finally:
+			sys.stderr = stderr
+		responses.seek(0)
+		self.assertEqual(_read_text_packets(responses), ['git-filter-server', 'version=2'])
+		self.assertEqual(_read_text_packets(responses), ['capability=clean', 'capability=smudge'])
+		for expected_text in [test_strings['space_text'], test_strings['et_text'], str(Text(long_et_text).from_elastic_tabstops().to_spaces(test_strings['tab_width']))]:
+			self.assertEqual(_read_text_packets(responses), ['status=success'])
+			self.assertEqual(_read_content(responses).decode('utf-8'), expected_text)
+			self.assertEqual(_read_text_packets(responses), [])
+		self.assertEqual(_read_text_packets(responses), ['status=error'])
+		self.assertEqual(responses.read(), b'')
+
+	def test_from_spaces_peak_memory(self):
+		"""Test that the peak memory used by from_spaces() and from_fixed_tabstops() stays within a budget per MB of input."""
+		# the resulting table alone takes about 9.5MB per MB of this input
+		max_peak_per_mb = 25
+		space_text = '\n'.join(['%sitem_%d   value %d   # comment %d' % ('    ' * (i % 4), i, i * 7, i) for i in range(2000)])
+		fixed_text = space_text.replace('    ', '\t')
+		for text, convert in ((space_text, lambda text: Text(text).from_spaces(4)), (fixed_text, lambda text: Text(text).from_fixed_tabstops(4))):
+			tracemalloc.start()
+			try:
+				convert(text)
+				_, peak = tracemalloc.get_traced_memory()
+			finally:
+				tracemalloc.stop()
+			self.assertLess(peak / (len(text) / 1e6), max_peak_per_mb * 1e6)
+
+	def test_to_spaces_diff(self):
+		"""Test to_spaces_diff() and realign_diff()."""
+		def apply_changes(text, changes):
+			lines = text.split('\n')
+			for change in reversed(changes):
+				lines[change.start:change.stop] = change.lines
+			return '\n'.join(lines)
+
+		for test_strings in TEST_STRINGS_LIST:
+			table = Table(test_strings['table'])
+			new_spaces = str(table.to_spaces(test_strings['tab_width']))
+			self.assertEqual([], table.to_spaces_diff(test_strings['space_text'], test_strings['tab_width']))
+			self.assertEqual([], Text(test_strings['space_text']).realign_diff(test_strings['tab_width']))
+			for original in (test_strings['et_text'], test_strings['space_text'] + '\nextra\nlines', '\n'.join(new_spaces.split('\n')[:-3])):
+				changes = table.to_spaces_diff(original, test_strings['tab_width'])
+				self.assertEqual(new_spaces, apply_changes(original, changes))
+
+		changes = Table(TABLE_3).to_spaces_diff(SPACE_TEXT_3.replace('x       jkl', 'x   jkl'))
+		self.assertEqual(changes, [(5, 6, ['x       jkl'])])
+
+	def test_indent_only(self):
+		"""Test the indent_only mode of from_spaces(), from_fixed_tabstops(), to_spaces() and to_fixed_tabstops()."""
+		for test_strings in TEST_STRINGS_LIST[:2]:
+			# these only contain indentation
+			self.assertEqual(test_strings['table'], Text(test_strings['space_text']).from_spaces(test_strings['tab_width'], indent_only=True))
+			self.assertEqual(test_strings['table'], Text(test_strings['ft_text']).from_fixed_tabstops(test_strings['tab_width'], indent_only=True))
+			self.assertEqual(test_strings['space_text'], Table(test_strings['table']).to_spaces(test_strings['tab_width'], indent_only=True))
+			self.assertEqual(test_strings['ft_text'], Table(test_strings['table']).to_fixed_tabstops(test_strings['tab_width'], indent_only=True))
+
+		table = Text(SPACE_TEXT_8).from_spaces(4, indent_only=True)
+		self.assertEqual(table[4], ['', '', '', 'source    => $source,'])
+		self.assertEqual(SPACE_TEXT_8, table.to_spaces(4, indent_only=True))
+		fixed_text = table.to_fixed_tabstops(4, indent_only=True)
+		self.assertEqual(fixed_text.string.split('\n')[4], '\t\t\tsource    => $source,')
+		self.assertEqual(table, Text(fixed_text.string).from_fixed_tabstops(4, indent_only=True))
+		self.assertEqual(Text(' \t  x\ty  ').from_spaces(4, indent_only=True), [['', 'x\ty  ']])
+
+	def test_alignment_checks(self):
+		"""Test is_aligned_spaces() and is_canonical_elastic()."""
+		for test_strings in TEST_STRINGS_LIST:
+			self.assertTrue(Text(test_strings['space_text']).is_aligned_spaces(test_strings['tab_width']))
+			if 'space_text_multiples' in test_strings:
+				self.assertTrue(Text(test_strings['space_text_multiples']).is_aligned_spaces(test_strings['tab_width'], multiples_of_tab_width=True))
+				if test_strings['space_text_multiples'] != test_strings['space_text']:
+					self.assertFalse(Text(test_strings['space_text_multiples']).is_aligned_spaces(test_strings['tab_width']))
+			self.assertTrue(Text(test_strings['et_text']).is_canonical_elastic(test_strings['tab_width']))
+		for misaligned in ('abc  \n', 'a  b\nccc  d', 'a        b\n        c', '    x\n'):
+			self.assertFalse(Text(misaligned).is_aligned_spaces(), misaligned)
+		# empty cells which aren't needed for alignment are lost converting to spaces and back
+		for uncanonical in ('a\t', 'a \tb', 'a\t b', 'a  b', 'a\t\tb c', 'b c\t\tb c'):
+			self.assertFalse(Text(uncanonical).is_canonical_elastic(), uncanonical)
+
+		# a misaligned first paragraph is found without tokenizing the rest of the text, which a conversion would have to
+		from unittest import mock
+		from elastictabstops import convert
+		aligned_text = '\n\n'.join([SPACE_TEXT_1] * 1000)
+		tokenize_line = mock.Mock(wraps=convert._tokenize_line)
+		with mock.patch.object(convert, '_tokenize_line', tokenize_line):
+			self.assertTrue(Text(aligned_text).is_aligned_spaces())
+			nof_aligned_lines = tokenize_line.call_count
+			tokenize_line.reset_mock()
+			self.assertFalse(Text('a  b\nccc  d\n\n' + aligned_text).is_aligned_spaces())
+			self.assertEqual(tokenize_line.call_count, 3)
+			tokenize_line.reset_mock()
+			Text('a  b\nccc  d\n\n' + aligned_text).from_spaces()
+			self.assertEqual(tokenize_line.call_count, nof_aligned_lines + 3)
+
+	def test_cli_check(self):
+		"""Test the command line's convert --check option."""
+		from elastictabstops.cli import main
+		with tempfile.TemporaryDirectory() as temp_dir:
+			path = os.path.join(temp_dir, 'text.txt')
+			with open(path, 'w') as fp:
+				fp.write(SPACE_TEXT_10)
+			self.assertEqual(0, main(['convert', '--to', 'spaces', '--check', path]))
+			self.assertEqual(0, main(['convert', '--from', 'spaces', '--to', 'elastic_tabstops', '-i', path]))
+			self.assertEqual(0, main(['convert', '--to', 'elastic_tabstops', '--check', path]))
+			with open(path) as fp:
+				self.assertEqual(ET_TEXT_10, fp.read())
+			stderr, sys.stderr = sys.stderr, io.StringIO()
+			try:
+				self.assertEqual(1, main(['convert', '--to', 'spaces', '--check', path]))
+			finally:
+				sys.stderr = stderr
+
+	def test_compressed_files(self):
+		"""Test converting gzip, bz2 and xz compressed files with the streaming conversion and the command line."""
+		import bz2, gzip, lzma
+		from elastictabstops.cli import main
+		from elastictabstops.stream import open_text
+		test_strings = TEST_STRINGS_LIST[0]
+		with tempfile.TemporaryDirectory() as temp_dir:
+			for extension, module in [('.gz', gzip), ('.bz2', bz2), ('.xz', lzma)]:
+				source = os.path.join(temp_dir, 'source' + extension)
+				dest = os.path.join(temp_dir, 'dest' + extension)
+				with module.open(source, 'wt', encoding='utf-8', newline='\n') as fp:
+					fp.write(test_strings['et_text'])
+				elastic_tabstops_to_spaces(source, dest, test_strings['tab_width'])
+				with module.open(dest, 'rt', encoding='utf-8', newline='\n') as fp:
+					self.assertEqual(test_strings['space_text'], fp.read())
+
+				# compressed files are read by their magic bytes, whatever they're called
+				unnamed = os.path.join(temp_dir, 'unnamed')
+				os.replace(dest, unnamed)
+				self.assertEqual(0, main(['convert', '--from', 'spaces', '--to', 'elastic_tabstops', '-o', dest, unnamed]))
+				with open_text(dest) as fp:
+					self.assertEqual(test_strings['et_text'], fp.read())
+				self.assertEqual(0, main(['convert', '--from', 'elastic_tabstops', '--to', 'spaces', '-t', str(test_strings['tab_width']), '-o', dest, source]))
+				with module.open(dest, 'rt', encoding='utf-8', newline='\n') as fp:
+					self.assertEqual(test_strings['space_text'], fp.read())
+
+			# an empty bz2 stream has no blocks, just the end of stream marker
+			empty = os.path.join(temp_dir, 'empty.bz2')
+			with bz2.open(empty, 'wb'):
+				pass
+			with open_text(empty) as fp:
+				self.assertEqual('', fp.read())
+			self.assertEqual(0, main(['convert', '--from', 'elastic_tabstops', '--to', 'spaces', '-o', dest + '.bz2', empty]))
+			with open(dest + '.bz2', 'rb') as fp:
+				self.assertEqual(b'', bz2.decompress(fp.read()))
+
+			# '.lzma' isn't an extension which is compressed when writing, as only xz data is written
+			lzma_path = os.path.join(temp_dir, 'dest.lzma')
+			self.assertEqual(0, main(['convert', '--from', 'elastic_tabstops', '--to', 'spaces', '-o', lzma_path, source]))
+			with open(lzma_path, 'rb') as fp:
+				self.assertFalse(fp.read().startswith(b'\xfd7zXZ\x00'))
+
+			plain = os.path.join(temp_dir, 'plain.txt')
+			with open(plain, 'w') as fp:
+				fp.write('BZh9 is not compressed')
+			with open_text(plain) as fp:
+				self.assertEqual('BZh9 is not compressed', fp.read())
+			with self.assertRaises(ValueError):
+				Table.open_elastic(os.path.join(temp_dir, 'source.gz'))
+
+	def test_runner(self):
+		"""Test the repository runner and its result cache."""
+		from elastictabstops.runner import ResultCache, run
+		with tempfile.TemporaryDirectory() as temp_dir:
+			cache = ResultCache(os.path.join(temp_dir, 'cache'))
+			paths = []
+			for num, test_strings in enumerate(TEST_STRINGS_LIST):
+				path = os.path.join(temp_dir, '%d.txt' % num)
+				with open(path, 'w', newline='') as fp:
+					fp.write(test_strings['et_text'] if num % 2 else test_strings['space_text'])
+				paths.append(path)
+
+			changed_paths = run(paths, 'elastic_tabstops_to_spaces', cache=cache, check=True)
+			self.assertEqual(paths[1::2], changed_paths)
+			with open(paths[1], 'rb') as fp:
+				data = fp.read()
+			self.assertEqual(Text(ET_TEXT_2).from_elastic_tabstops().to_spaces().string.encode('utf-8'), cache.get(cache.key(data, 'elastic_tabstops_to_spaces', 8), data))
+			self.assertIsNone(cache.get(cache.key(data, 'elastic_tabstops_to_spaces', 4), data))
+
+			# a second run uses the cache, and this time converts the files
+			self.assertEqual(changed_paths, run(paths, 'elastic_tabstops_to_spaces', cache=cache))
+			with open(paths[1]) as fp:
+				self.assertEqual(Text(ET_TEXT_2).from_elastic_tabstops().to_spaces(), fp.read())
+
+			self.assertGreater(cache.prune(0), 0)
+			self.assertEqual(0, cache.prune(0))
+
+	@unittest.skipUnless(shutil.which('git'), 'git is needed')
+	def test_runner_staged(self):
+		"""Test that the runner converts and stages the staged content of files, caching results in the git directory."""
+		import subprocess
+		from elastictabstops.runner import ResultCache, default_cache_dir, run, staged_files
+		with tempfile.TemporaryDirectory() as temp_dir:
+			subprocess.check_call(['git', 'init', '-q'], cwd=temp_dir)
+			path = os.path.join(temp_dir, 'a.txt')
+			with open(path, 'w', newline='') as fp:
+				fp.write(ET_TEXT_2)
+			subprocess.check_call(['git', 'add', 'a.txt'], cwd=temp_dir)
+			# an unstaged change is converted in the working tree but not staged
+			with open(path, 'a', newline='') as fp:
+				fp.write('\nx\ty')
+
+			cache = ResultCache(default_cache_dir(temp_dir))
+			paths = staged_files(temp_dir)
+			self.assertEqual([os.path.realpath(path)], [os.path.realpath(staged_path) for staged_path in paths])
+			self.assertEqual(paths, run(paths, 'elastic_tabstops_to_spaces', cache=cache, check=True, staged=True))
+			self.assertEqual(paths, run(paths, 'elastic_tabstops_to_spaces', cache=cache, staged=True))
+			staged_text = subprocess.check_output(['git', 'show', ':a.txt'], cwd=temp_dir).decode('utf-8')
+			self.assertEqual(convert_text(ET_TEXT_2, 'elastic_tabstops_to_spaces'), staged_text)
+			with open(path, newline='') as fp:
+				self.assertEqual(convert_text(ET_TEXT_2 + '\nx\ty', 'elastic_tabstops_to_spaces'), fp.read())
+			self.assertEqual([], run(paths, 'elastic_tabstops_to_spaces', cache=cache, staged=True))
+
+			status = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=all'], cwd=temp_dir).decode('utf-8')
+			self.assertNotIn('cache', status)
+			self.assertTrue(os.path.isdir(os.path.join(temp_dir, '.git', 'elastictabstops-cache')))
+
+	def test_render_window(self):
+		"""Test render_window()."""
+		for test_strings in TEST_STRINGS_LIST:
+			table = Table(test_strings['table'])
+			for multiples_of_tab_width in (False, True):
+				all_lines = table.to_spaces(test_strings['tab_width'], multiples_of_tab_width).string.split('\n')
+				for start in range(len(table)):
+					for stop in (start + 1, start + 3, len(table) + 5):
+						self.assertEqual(all_lines[start:stop], table.render_window(start, stop, test_strings['tab_width'], multiples_of_tab_width))
+		self.assertEqual([], Table(TABLE_1).render_window(5, 5))
+
+	def test_open_elastic(self):
+		"""Test Table.open_elastic()."""
+		with tempfile.TemporaryDirectory() as temp_dir:
+			path = os.path.join(temp_dir, 'text.txt')
+			for test_strings in TEST_STRINGS_LIST + [{'et_text': '', 'table': [['']], 'tab_width': 8}]:
+				with open(path, 'w', newline='') as fp:
+					fp.write(test_strings['et_text'])
+				with Table.open_elastic(path) as table:
+					orig_table = Table(test_strings['table'])
+					self.assertEqual(orig_table, table)
+					self.assertEqual(len(orig_table), len(table))
+					self.assertEqual(orig_table[-1], table[-1])
+					self.assertEqual(test_strings['et_text'], table.to_elastic_tabstops())
+					self.assertEqual(orig_table.to_spaces(test_strings['tab_width']), table.to_spaces(test_strings['tab_width']))
+					self.assertEqual(orig_table.to_fixed_tabstops(test_strings['tab_width']), table.to_fixed_tabstops(test_strings['tab_width']))
+					self.assertEqual(orig_table.render_window(1, 4, test_strings['tab_width']), table.render_window(1, 4, test_strings['tab_width']))
+				self.assertTrue(table._list._file.closed)
+		Table(TABLE_1).close()
+
+	def test_live_table(self):
+		"""Test LiveTable."""
+		for test_strings in TEST_STRINGS_LIST:
+			for multiples_of_tab_width in (False, True):
+				live_table = LiveTable(test_strings['tab_width'], multiples_of_tab_width)
+				lines = []
+				for row_num, row in enumerate(test_strings['table']):
+					for line_num, text in live_table.append(row):
+						if line_num == len(lines):
+							lines.append(text)
+						else:
+							lines[line_num] = text
+					self.assertEqual(Table(test_strings['table'][:row_num + 1]).to_spaces(test_strings['tab_width'], multiples_of_tab_width), '\n'.join(lines))
+
+		live_table = LiveTable(4)
+		self.assertEqual([(0, 'a   b')], live_table.append(['a', 'b']))
+		self.assertEqual([(1, 'c')], live_table.append(['c']))
+		self.assertEqual([(2, 'dd  e')], live_table.append(['dd', 'e']))
+		self.assertEqual([(2, 'dd     e'), (3, 'fffff  g')], live_table.append(['fffff', 'g']))
+		self.assertEqual(len(live_table._rows), 2)
+
+	def test_layout_snapshot(self):
+		"""Test saving and loading layout snapshots, and rendering with them."""
+		from elastictabstops.snapshot import LayoutSnapshot
+		with tempfile.TemporaryDirectory() as temp_dir:
+			layout_path = os.path.join(temp_dir, 'text.layout')
+			for test_strings in TEST_STRINGS_LIST:
+				table = Table(test_strings['table'])
+				LayoutSnapshot.compute(table).save(layout_path)
+				with LayoutSnapshot.load(layout_path, table) as snapshot:
+					for tab_width in (2, test_strings['tab_width']):
+						for multiples_of_tab_width in (False, True):
+							self.assertEqual(table.to_spaces(tab_width, multiples_of_tab_width, layout=snapshot), table.to_spaces(tab_width, multiples_of_tab_width))
+
+			path = os.path.join(temp_dir, 'text.txt')
+			with open(path, 'w', newline='\n') as fp:
+				fp.write(ET_TEXT_10)
+			with Table.open_elastic(path) as table:
+				LayoutSnapshot.compute(table).save(layout_path)
+				with LayoutSnapshot.load(layout_path, Text(ET_TEXT_10).from_elastic_tabstops()) as snapshot:
+					self.assertEqual(table.to_spaces(4, layout=snapshot), Text(ET_TEXT_10).from_elastic_tabstops().to_spaces(4))
+
+			with self.assertRaises(ValueError):
+				LayoutSnapshot.load(layout_path, Text(ET_TEXT_1).from_elastic_tabstops())
+
+			# a snapshot loaded without its table is still checked against each row's number of terminated cells
+			LayoutSnapshot.compute([['a', 'b', 'c'], ['d', 'e']]).save(layout_path)
+			with LayoutSnapshot.load(layout_path) as snapshot:
+				self.assertEqual(Table([['a', 'bb', 'c'], ['d', 'e']]).to_spaces(4, layout=snapshot), 'a   bb  c\nd   e')
+				with self.assertRaises(ValueError):
+					Table([['a', 'b'], ['d', 'e', 'f', 'g']]).to_spaces(4, layout=snapshot)
+			with open(layout_path, 'r+b') as fp:
+				fp.truncate(100)
+			with self.assertRaises(ValueError):
+				LayoutSnapshot.load(layout_path)
+
+	def test_parallel_to_spaces(self):
+		"""Test that sizing column blocks in worker processes gives the same result as to_spaces()."""
+		rows = [[('x' * ((line_num * 7 + cell_num * 3) % 11))[:cell_num % 5 + 1] for cell_num in range(40 + line_num % 3)] for line_num in range(30)]
+		rows[10] = ['short', 'row']
+		table = Table(rows)
+		for multiples_of_tab_width in (False, True):
+			self.assertEqual(table.to_spaces(4, multiples_of_tab_width, processes=2), table.to_spaces(4, multiples_of_tab_width))
+		for test_strings in TEST_STRINGS_LIST:
+			self.assertEqual(Table(test_strings['table']).to_spaces(test_strings['tab_width'], processes=2), test_strings['space_text'])
+
+	def test_engines(self):
+		"""Test that every engine gives the same result, and that 'auto' chooses by the profile's costs."""
+		from elastictabstops import engine
+		for test_strings in TEST_STRINGS_LIST:
+			tab_width = test_strings['tab_width']
+			table = Table(test_strings['table'])
+			for engine_name in ('auto', 'serial', 'single_pass', 'streaming'):
+				for multiples_of_tab_width in (False, True):
+					self.assertEqual(table.to_spaces(tab_width, multiples_of_tab_width, engine=engine_name), table.to_spaces(tab_width, multiples_of_tab_width))
+				self.assertEqual(table.to_fixed_tabstops(tab_width, engine=engine_name), table.to_fixed_tabstops(tab_width))
+			for engine_name in ('auto', 'serial', 'cached'):
+				self.assertEqual(Text(test_strings['space_text']).from_spaces(tab_width, engine=engine_name), table)
+				self.assertEqual(Text(test_strings['ft_text']).from_fixed_tabstops(tab_width, engine=engine_name), Text(test_strings['ft_text']).from_fixed_tabstops(tab_width))
+			self.assertEqual(convert_text(test_strings['et_text'], 'elastic_tabstops_to_spaces', tab_width, engine='auto'), test_strings['space_text'])
+		with self.assertRaises(ValueError):
+			Table([['a', 'b']]).to_spaces(engine='vectorized')
+		with self.assertRaises(ValueError):
+			Text('a').from_elastic_tabstops(engine='cached')
+
+		profile = {'version': engine.PROFILE_VERSION, 'from_spaces': {'serial': [0.0, 1.0], 'cached': [0.0, 2.0, 0.1]}, 'to_spaces': {'serial': [0.0, 1.0], 'single_pass': [5.0, 0.5], 'parallel': None}}
+		self.assertEqual(engine.select_engine('to_spaces', 'auto', [['a', 'b']], profile), 'serial')
+		with self.assertLogs('elastictabstops', 'DEBUG') as logs:
+			self.assertEqual(engine.select_engine('to_spaces', 'auto', [['a', 'b']] * 10, profile), 'single_pass')
+		self.assertIn('to_spaces: single_pass engine (auto', logs.output[0])
+		self.assertEqual(engine.select_engine('from_spaces', 'auto', 'a  b\nc  d', profile), 'serial')
+		self.assertEqual(engine.select_engine('from_spaces', 'auto', 'a  b\n' * 100, profile), 'cached')
+		self.assertEqual(engine.text_shape('a\nb\na\nb'), engine.TextShape(7, 4, 0.5))
+		self.assertEqual(engine.select_engine('to_spaces', 'auto', [['a' * 100, 'b']] * 10000, engine.DEFAULT_PROFILE), 'serial')
+
+		with tempfile.TemporaryDirectory() as temp_dir:
+			path = os.path.join(temp_dir, 'profile.json')
+			calibrated = engine.calibrate(large_cells=500, min_time=0.001)
+			self.assertEqual(engine.save_profile(calibrated, path), path)
+			engine._profiles.clear()
+			self.assertEqual(engine.load_profile(path), calibrated)
+			self.assertIn('serial', engine.estimated_costs('to_spaces', engine.table_shape([['a', 'b']]), calibrated))
+			with open(path, 'w') as fp:
+				fp.write('{"version": 0}')
+			engine._profiles.clear()
+			with self.assertLogs('elastictabstops', 'WARNING'):
+				self.assertEqual(engine.load_profile(path), engine.DEFAULT_PROFILE)
+			engine._profiles.clear()
+
+			# files converted from elastic tabstops to spaces by the command line are streamed
+			from elastictabstops.cli import main
+			in_path = os.path.join(temp_dir, 'in.txt')
+			out_path = os.path.join(temp_dir, 'out.txt')
+			with open(in_path, 'w', newline='\n') as fp:
+				fp.write(ET_TEXT_1)
+			for engine_name, logged in (('auto', 'to_spaces: streaming engine'), ('serial', 'to_spaces: serial engine (requested)')):
+				with self.assertLogs('elastictabstops', 'DEBUG') as logs:
+					self.assertEqual(0, main(['convert', '--from', 'elastic_tabstops', '--to', 'spaces', '--engine', engine_name, '-o', out_path, in_path]))
+				self.assertTrue(any([logged in output for output in logs.output]))
+				with open(out_path) as fp:
+					self.assertEqual(fp.read(), SPACE_TEXT_1)
+
+	def test_to_spaces_multi(self):
+		"""Test Table.to_spaces_multi() and Table.to_fixed_tabstops_multi()."""
+		tab_widths = [2, 4, 8]
+		for test_strings in TEST_STRINGS_LIST:
+			table = Table(test_strings['table'])
+			for multiples_of_tab_width in (False, True):
+				texts = table.to_spaces_multi(tab_widths, multiples_of_tab_width)
+				self.assertEqual(sorted(texts), tab_widths)
+				for tab_width in tab_widths:
+					self.assertEqual(texts[tab_width], table.to_spaces(tab_width, multiples_of_tab_width))
+			texts = table.to_fixed_tabstops_multi(tab_widths)
+			for tab_width in tab_widths:
+				self.assertEqual(texts[tab_width], table.to_fixed_tabstops(tab_width))
+		self.assertEqual(Table.from_records([('a', 'bb'), ('ccc', 'd')]).to_spaces_multi([4]), {4: 'a    bb\nccc  d'})
+		with self.assertRaises(ValueError):
+			Table([['a']]).to_spaces_multi([4, 1])
+
+	def test_max_column_width(self):
+		"""Test capping column widths with each overflow policy."""
+		table = Table([['a', 'b'], ['http://example.com/path', 'c'], ['dd', 'e'], ['x']])
+		self.assertEqual(table.to_spaces(4, max_column_width=8), 'a         b\nhttp://\u2026  c\ndd        e\nx')
+		self.assertEqual(table.to_spaces(4, max_column_width=8, overflow='wrap'), 'a         b\nhttp://e  c\nxample.c\nom/path\ndd        e\nx')
+		self.assertEqual(table.to_spaces(4, max_column_width=8, overflow='exclude'), 'a   b\nhttp://example.com/path  c\ndd  e\nx')
+		self.assertEqual(table.to_fixed_tabstops(4, max_column_width=8), 'a\t\t\tb\nhttp://\u2026\tc\ndd\t\t\te\nx')
+		# excluded cells are followed by enough space to reach a tabstop
+		self.assertEqual(table.to_spaces(4, True, max_column_width=8, overflow='exclude'), 'a   b\nhttp://example.com/path     c\ndd  e\nx')
+		self.assertEqual(table.to_fixed_tabstops(4, max_column_width=8, overflow='exclude'), 'a\tb\nhttp://example.com/path\t\tc\ndd\te\nx')
+		self.assertEqual(Table([['http://example.com/very/long/url', 'x']]).to_fixed_tabstops(4, max_column_width=10, overflow='exclude'), 'http://example.com/very/long/url\tx')
+		for test_strings in TEST_STRINGS_LIST:
+			table = Table(test_strings['table'])
+			# a limit no cell reaches changes nothing
+			for overflow in ('truncate', 'wrap', 'exclude'):
+				self.assertEqual(table.to_spaces(test_strings['tab_width'], max_column_width=1000, overflow=overflow), test_strings['space_text'])
+		with self.assertRaises(ValueError):
+			table.to_spaces(4, max_column_width=8, overflow='hide')
+		with self.assertRaises(ValueError):
+			table.to_spaces(4, max_column_width=0)
+
+	def test_token_cache(self):
+		"""Test that from_spaces() and from_fixed_tabstops() give the same results with a TokenCache, and only tokenize lines they haven't seen."""
+		cache = TokenCache()
+		for test_strings in TEST_STRINGS_LIST:
+			for _ in range(2):
+				self.assertEqual(Text(test_strings['space_text']).from_spaces(test_strings['tab_width'], cache=cache), test_strings['table'])
+				self.assertEqual(Text(test_strings['et_text']).from_fixed_tabstops(test_strings['tab_width'], cache=cache), Text(test_strings['et_text']).from_fixed_tabstops(test_strings['tab_width']))
+
+		cache = TokenCache(max_size=3)
+		Text('a  b\nc  d').from_spaces(4, cache=cache)
+		self.assertEqual(cache.info(), (0, 2, 3, 2))
+		Text('a  b\ne  f').from_spaces(4, cache=cache)
+		self.assertEqual(cache.info(), (1, 3, 3, 3))
+		Text('g\na  b').from_spaces(4, cache=cache)
+		# 'c  d' was least recently used so it was evicted
+		self.assertEqual(cache.info(), (2, 4, 3, 3))
+		Text('c  d').from_spaces(4, cache=cache)
+		self.assertEqual(cache.info().misses, 5)
+		cache.clear()
+		self.assertEqual(cache.info(), (0, 0, 3, 0))
+
+	def test_scaling(self):
+		"""Test that no conversion's work grows much faster than its input on pathological text."""
+		# lines of code run rather than timings, so the result doesn't depend on the machine's load. Linear growth
+		# gives an exponent of about 1 and quadratic growth about 2
+		self.assertEqual([], fuzz.check_scaling(sizes=(1000, 2000, 4000, 8000), max_exponent=1.2, cost=fuzz.count_steps))
+		self.assertEqual(fuzz.count_steps(len, 'abc'), 0)
+		steps = [fuzz.count_steps(lambda text: Text(text).from_spaces(4), 'a  b\n' * nof_lines) for nof_lines in (10, 20)]
+		self.assertEqual(steps, [fuzz.count_steps(lambda text: Text(text).from_spaces(4), 'a  b\n' * nof_lines) for nof_lines in (10, 20)])
+		self.assertLess(steps[0], steps[1])
+
+	def test_limits(self):
+		"""Test that conversions raise a ValueError when their input exceeds the given limits."""
+		limits = Limits(max_line_length=20, max_cells_per_line=4, max_inserted_cells=3)
+		self.assertEqual(Text('a  b\nc  d').from_spaces(4, limits=limits), [['a', 'b'], ['c', 'd']])
+		with self.assertRaises(ValueError):
+			Text('x' * 21).from_spaces(4, limits=limits)
+		with self.assertRaises(ValueError):
+			Text('a  b  c  d  e').from_spaces(4, limits=limits)
+		with self.assertRaises(ValueError):
+			Text('\n'.join([' ' * 8 + 'x'] * 2)).from_spaces(4, limits=limits)
+		with self.assertRaises(ValueError):
+			Text('a\tb\tc').from_fixed_tabstops(4, limits=Limits(max_cells_per_line=2))
+		with self.assertRaises(ValueError):
+			Text('a\tb\tc\td\te').from_elastic_tabstops(limits=limits)
+		table = Text('a\tb\tc\td\te').from_elastic_tabstops()
+		with self.assertRaises(ValueError):
+			table.to_spaces(4, limits=limits)
+		with self.assertRaises(ValueError):
+			table.to_fixed_tabstops(4, limits=limits)
+		self.assertEqual(table.to_spaces(4, limits=Limits(max_line_length=9)), 'a   b   c   d   e')
+
 	def test_cell_exists(self):
 		"""Test _cell_exists()."""
 		list_of_lists = [[], [1], [2, 3], [4, 5, 6], ]
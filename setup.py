@@ -10,8 +10,8 @@ setup(name='ElasticTabstops',
     long_description_content_type='text/markdown',
     classifiers=[
         'License :: OSI Approved :: MIT License',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
         'Topic :: Text Processing',
         'Topic :: Text Processing :: Filters',
         'Topic :: Text Processing :: General',
@@ -22,6 +22,7 @@ setup(name='ElasticTabstops',
     author_email='nick@nickgravgaard.com',
     url='https://github.com/nickgravgaard/elastic-tabstops-py',
     license='MIT/X11',
+    python_requires='>=3.6',
     packages=find_packages(exclude=['ez_setup', 'examples', 'tests']),
     include_package_data=True,
     zip_safe=False,
@@ -30,5 +31,7 @@ setup(name='ElasticTabstops',
     ],
     entry_points="""
     # -*- Entry points: -*-
+    [console_scripts]
+    elastictabstops = elastictabstops.cli:main
     """,
     )